@@ -4,35 +4,30 @@ st.set_page_config(
     page_title="Macro Tracker",
     layout="wide",
     initial_sidebar_state="expanded")
-from db import supabase
+import tracing
+from tracing import traced, span
+tracing.begin(st.session_state.get("user_id"))
 from postgrest.exceptions import APIError
-from data import fetch_goals, fetch_logs, fetch_recipes
+from charts import entry_donuts_html, get_chart_cache, content_key
+from nutrition import get_nutrition_db
+from splash import welcome_animation
+from db import client_stats, CircuitOpen
+from cache import get_user_cache
+from export import export_bytes, available_formats, FORMATS as EXPORT_FORMATS
+from data import bootstrap, save_rows, log_foods, update_row, delete_rows, resolve_user, fetch_recipes, recipe_index, diff_recipes, fetch_daily_totals, day_totals, day_entries, suggest_foods, mirror_stats
 from typing import Union, List, Dict
 import pandas as pd
-import numpy as np
 from datetime import datetime, timedelta
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import altair as alt
-import plotly.express as px
 from streamlit_option_menu import option_menu
-from streamlit_lottie import st_lottie
-import requests
 import pytz
 import uuid
+# plotly, altair and streamlit_lottie are imported where they are
+# first used, so the login form and the tab being shown never wait on them
 # ------------------------- App Variables -------------------------
 eastern = pytz.timezone("US/Eastern")
 now = datetime.now(eastern)
 version = 0.32
 
-@st.cache_data
-def load_lottie_url(url: str):
-    r = requests.get(url)
-    if r.status_code != 200:
-        return None
-    return r.json()
-
-
 
 if "animation" not in st.session_state:
     st.session_state["animation"] = True
@@ -40,12 +35,15 @@ if "animation" not in st.session_state:
 if "user_id" in st.session_state:
     st.session_state["animation"] = False
 
-# 1) pick any Lottie JSON URL you like
-lottie_url = "https://assets10.lottiefiles.com/packages/lf20_x62chJ.json"
-anim = load_lottie_url(lottie_url)
+# 1) bundled with the app; set MACRO_TRACKER_LOTTIE_URL to use a remote one (see splash.py)
+anim = None
+if st.session_state["animation"]:
+    with span("welcome_animation"):
+        anim = welcome_animation()
 
 # 2) display it (height in pixels)
 if anim and st.session_state["animation"]:
+    from streamlit_lottie import st_lottie
     st.subheader("Welcome to Your Macro Dashboard. Enter your Username to continue.")
     st_lottie(
         anim,
@@ -57,31 +55,38 @@ if anim and st.session_state["animation"]:
     )
 
 # ------------------------- Functions -------------------------
-# ______ 1. Upsert ______
+# ______ 1. Writes ______
+def attempt(error_msg: str, write, *args, **kwargs):
+    """
+    Run one write; returns its result, or None after showing why it failed.
+    With the circuit breaker open nothing was sent, so that is a warning.
+    """
+    try:
+        return write(*args, **kwargs)
+    except APIError as e:
+        st.error(f"{error_msg}: {e}")
+    except CircuitOpen as e:
+        st.warning(f"{e}; nothing was saved. Try again in a moment.")
+    return None
+
 def upsert(
         table: str, 
         records: Union[Dict, List[Dict]],
         success_msg: str = "Saved!"
 ):
     with st.spinner(f"Saving to {table}..."):
-        try:
-            res = supabase.table(table).upsert(records).execute()
-        except APIError as e:
-            st.error(f"Database error on upsert to '{table}':{e}")
-            return None
+        saved = attempt(f"Database error on upsert to '{table}'", save_rows, table, records, upsert=True)
+    if saved is None:
+        return None
     st.success(success_msg)
-    return res.data
+    return saved
 
 # ______ 2. Edit and Save Goals ______
+@traced
 def render_goal_editor(): 
     st.subheader("Set your macro goals")
     
-    existing = st.session_state.get("macro_goals", {
-        "calories": 2000,
-        "protein": 150,
-        "carbs": 250,
-        "fat": 70
-    })
+    existing = user_data("macro_goals")["goals"]
     
     cal = st.number_input("Calories", min_value=0,value=existing["calories"])
     pro = st.number_input("Protein (g)", min_value=0,value=existing["protein"])
@@ -98,7 +103,6 @@ def render_goal_editor():
         }
         saved = upsert("macro_goals", new_goals, success_msg = "Goals saved!")
         if saved:
-            st.session_state["macro_goals"] = new_goals
             st.session_state["editing_goals"] = False
             st.session_state["goals_saved"] = True
 
@@ -106,68 +110,28 @@ def render_goal_editor():
 # ______ 2. Recipe Functions ______
 def save_recipes(recipes_dict: dict[str, dict]):
     """
-    recipes_dict: maps recipe_name → {foods, calories, protein, carbs, fat}
-    Uses st.session_state['recipes_list'] (a list of full record-dicts with recipe_id)
+    recipes_dict: maps recipe_name → {foods, calories, protein, carbs, fat}, the user's full recipe set
+    Only recipes that differ from the cached records are sent; removed ones go in one delete.
     """
 
-    user_id      = st.session_state["user_id"]
-    existing_lst = st.session_state.get("recipes_list", [])
+    user_id  = st.session_state["user_id"]
+    existing = fetch_recipes(user_id)
 
-    # build a name → id map for convenience
-    existing_map = {
-        rec["recipe_name"]: rec["recipe_id"]
-        for rec in existing_lst
-    }
+    # 1) Diff against the cached records by content hash
+    to_upsert, removed = diff_recipes(user_id, recipes_dict, existing)
 
-    # 1) Collect upserts
-    to_upsert = []
-    for name, data in recipes_dict.items():
-        rec = {
-            "user_id":      user_id,
-            "recipe_name":  name,
-            "foods":        data["foods"],
-            "calories":     data["calories"],
-            "protein":      data["protein"],
-            "carbs":        data["carbs"],
-            "fat":          data["fat"],
-        }
-        # if it already existed, include the PK so Supabase updates instead of inserting
-        if name in existing_map:
-            rec["recipe_id"] = existing_map[name]
-
-        to_upsert.append(rec)    # ← correct usage, not `append = rec`
-
-    # 2) Fire off the upsert
+    # 2) Fire off the upsert (changed and new recipes only)
     if to_upsert:
         saved = upsert("recipes", to_upsert, success_msg="Recipes saved!")
         if not saved:
             return  # abort if upsert failed
 
-    # 3) Delete any recipes the user removed
-    removed = set(existing_map) - set(recipes_dict)
-    for name in removed:
-        rid = existing_map[name]
-        with st.spinner(f"Deleting '{name}'…"):
-            res = (
-                supabase
-                  .table("recipes")
-                  .delete()
-                  .eq("recipe_id", rid)
-                  .execute()
-            )
-        if res.error:
-            st.error(f"Couldn’t delete '{name}': {res.error.message}")
-
-    # 4) Refresh your in-memory list of full records
-    resp = (
-        supabase
-          .table("recipes")
-          .select("recipe_id,recipe_name,foods,calories,protein,carbs,fat")
-          .eq("user_id", user_id)
-          .execute()
-    )
+    # 3) Delete any recipes the user removed, in one request
+    if removed:
+        with st.spinner(f"Deleting {len(removed)} recipe(s)…"):
+            attempt("Couldn’t delete recipes", delete_rows, "recipes", user_id, removed)
 
-    st.session_state["recipes_list"] = resp.data or []
+    # 4) The cache was patched by the writes above; no reload needed
     st.success("Recipes synced!")
 
 # ______ 3. Food Log Functions______
@@ -179,11 +143,76 @@ FOOD_FIELDS = [
     ("fat_input", "Fat (g)", 0.0)
 ]
 
+def display_time(value) -> str:
+    """'08:30:00' → '8:30 AM'; anything unparseable is shown as-is."""
+    try:
+        return datetime.strptime(str(value), "%H:%M:%S").strftime("%-I:%M %p")
+    except ValueError:
+        return str(value or "")
+
+@traced
+def render_food_suggestions(form_keys: dict, key: str):
+    """
+    Search over the foods this user has logged before.  Picking a match fills
+    the form widgets named in form_keys (food/calories/protein/carbs/fat → widget key)
+    with its name and last-used macros.
+    """
+    query = st.text_input("Search foods you've logged", key=f"{key}_query", placeholder="e.g. whey")
+    hits  = suggest_foods(st.session_state["user_id"], query)
+    if not hits:
+        return
+    options = {f"{h['food']} · {h['calories']:g} kcal · logged {h['count']}×": h for h in hits}
+
+    def fill_form():
+        hit = options.get(st.session_state[f"{key}_pick"])
+        if hit:
+            for field, widget in form_keys.items():
+                st.session_state[widget] = hit[field]
+
+    st.selectbox("Fill from history", ["—"] + list(options), key=f"{key}_pick", on_change=fill_form)
+
+@traced
+def render_nutrition_lookup(form_keys: dict, key: str, accumulate: bool = False):
+    """
+    Search the bundled nutrition table.  Picking a food fills the form widgets
+    named in form_keys with its macros scaled by the number of servings; with
+    accumulate=True (recipe builder) the food is appended to the ingredient
+    list and its macros are added to the running totals instead.
+    """
+    col_q, col_n = st.columns([3, 1])
+    query    = col_q.text_input("Search nutrition database", key=f"{key}_query", placeholder="e.g. chicken breast")
+    col_n.number_input("Servings", min_value=0.25, value=1.0, step=0.25, key=f"{key}_servings")
+    hits = get_nutrition_db().lookup(query)
+    if not hits:
+        return
+    options = {f"{h['food']} · {h['serving']} · {h['calories']:g} kcal": h for h in hits}
+
+    def fill_form():
+        hit = options.get(st.session_state[f"{key}_pick"])
+        if not hit:
+            return
+        n = st.session_state[f"{key}_servings"]
+        for field, widget in form_keys.items():
+            if field == "food":
+                label = hit["food"] if n == 1 else f"{hit['food']} ×{n:g}"
+                if accumulate:
+                    label = label.replace(",", "")   # the ingredient list is comma separated
+                current = st.session_state.get(widget, "") if accumulate else ""
+                st.session_state[widget] = f"{current}, {label}" if current else label
+            else:
+                value = round(hit[field] * n, 1)
+                st.session_state[widget] = st.session_state.get(widget, 0.0) + value if accumulate else value
+        st.session_state[f"{key}_pick"] = "—"
+
+    st.selectbox("Add from database" if accumulate else "Fill from database",
+                 ["—"] + list(options), key=f"{key}_pick", on_change=fill_form)
+
 def reset_food_form():
     """Zero out inputs"""
     for key, _, default in FOOD_FIELDS:
         st.session_state[key] = default
 
+@traced
 def render_food_log_tab():
     col1, _ = st.columns([2, 1.5])
     with col1:
@@ -194,6 +223,14 @@ def render_food_log_tab():
             st.session_state["expander_open"] = False
 
         with st.expander("Add a meal", expanded=st.session_state["expander_open"]):
+            render_food_suggestions({
+                "food": "food_name_input", "calories": "calories_input",
+                "protein": "protein_input", "carbs": "carb_input", "fat": "fat_input",
+            }, key="food_tab_suggest")
+            render_nutrition_lookup({
+                "food": "food_name_input", "calories": "calories_input",
+                "protein": "protein_input", "carbs": "carb_input", "fat": "fat_input",
+            }, key="food_tab_nutrition")
             # ── The form ──────────────────────────────────────────────────────
             with st.form("food_form"):
                 food     = st.text_input("Food name", key="food_name_input")
@@ -217,32 +254,21 @@ def render_food_log_tab():
                 }
 
                 with st.spinner("Saving to Supabase…"):
-                    res = supabase.table("food_logs").insert(new_row).execute()
+                    saved = attempt("Error logging food", log_foods, user_id, [new_row])
 
-                if hasattr(res, "status_code") and res.status_code >= 400:
-                    st.error(f"Error logging food ({res.status_code}): {res.status_text}")
-                else:
+                if saved is not None:
                     st.success("✅ Food logged!")
-                    # clear the cache so fetch_logs returns fresh data
-                    fetch_logs.clear()
                     # close the expander and rerun so the new log shows up
                     st.session_state["expander_open"] = False
                     st.rerun()
 
+@traced
 def render_log_tab2():
     st.subheader("Log Food or Recipe")
 
-    # 1) Fetch recipes once
-    resp = (
-        supabase
-          .table("recipes")
-          .select("recipe_id,recipe_name,foods,calories,protein,carbs,fat")
-          .eq("user_id", st.session_state["user_id"])
-          .order("recipe_name")
-          .execute()
-    )
-    recipes = resp.data or []
-    names   = [r["recipe_name"] for r in recipes]
+    # 1) Recipes come from the shared per-user index; no query here
+    recipes = recipe_index(st.session_state["user_id"])
+    names   = recipes.names
 
     # 2) Let them pick a recipe or manual
     choice = st.selectbox(
@@ -273,17 +299,14 @@ def render_log_tab2():
                 "fat":      fat
             }
             with st.spinner("Logging…"):
-                res = supabase.table("food_logs").insert(new_row).execute()
-            if res.error:
-                st.error(res.error.message)
-            else:
+                saved = attempt("Error logging food", log_foods, user_id, [new_row])
+            if saved is not None:
                 st.success(f"Logged '{food}'")
-                fetch_logs.clear()
-                st.experimental_rerun()
+                st.rerun()
 
     # 3b) Recipe entry
     else:
-        recipe = next(r for r in recipes if r["name"] == choice)
+        recipe = recipes.get(choice)
         st.markdown(f"**Includes:** {', '.join(recipe['foods'])}")
         st.markdown(
             f"**Calories:** {recipe['calories']}, "
@@ -303,12 +326,9 @@ def render_log_tab2():
                 "fat":      recipe["fat"]
             }
             with st.spinner("Logging…"):
-                res = supabase.table("food_logs").insert(new_row).execute()
-            if res.error:
-                st.error(res.error.message)
-            else:
+                saved = attempt("Error logging food", log_foods, user_id, [new_row])
+            if saved is not None:
                 st.success(f"Logged recipe '{choice}'")
-                fetch_logs.clear()
                 st.rerun()
 
 from streamlit_option_menu import option_menu
@@ -317,9 +337,11 @@ from streamlit_option_menu import option_menu
 
 
 #______ 4. Recipe Tab _______________
+@traced
 def render_recipe_tab():
     st.subheader("Log a Saved Recipe")
 
+    index = recipe_index(user_id)
     recipes = {
         row["recipe_name"]: {
             "recipe_id": row["recipe_id"],
@@ -329,14 +351,14 @@ def render_recipe_tab():
             "carbs": row["carbs"],
             "fat": row["fat"]
         }
-        for row in raw_recipes
+        for row in index.by_id.values()
     }
     
     # --- 1) Log an existing recipe ---
     if recipes:
         selected = st.selectbox(
             "Select a recipe to log:",
-            ["-- Select --"] + sorted(recipes.keys()),
+            ["-- Select --"] + index.names,
             key="select_recipe"
         )
         if selected != "-- Select --":
@@ -360,12 +382,12 @@ def render_recipe_tab():
                     "fat":      data["fat"],
                 }
                 with st.spinner("Logging recipe…"):
-                    res = supabase.table("food_logs").insert(new_row).execute()
-                # supabase-py v2 raises on HTTP errors, so if we reach here:
-                st.success(f"✅ '{selected}' logged!")
-                fetch_logs.clear()                         # clear cache so logs refetch
-                st.session_state["saved_recipe_logged"] = True
-                st.rerun()
+                    # also writes through to this user's cached logs
+                    saved = attempt("Error logging recipe", log_foods, user_id, [new_row])
+                if saved is not None:
+                    st.success(f"✅ '{selected}' logged!")
+                    st.session_state["saved_recipe_logged"] = True
+                    st.rerun()
     else:
         st.info("No recipes saved yet. Create one below!")
 
@@ -392,7 +414,7 @@ def render_recipe_tab():
             # basic validation
             if not name.strip():
                 st.warning("Please enter a valid recipe name.")
-            elif name in recipes:
+            elif name in index:
                 st.warning("That name is already in use. Pick another.")
             else:
                 foods_list = [f.strip() for f in foods.split(",") if f.strip()]
@@ -410,28 +432,16 @@ def render_recipe_tab():
                     }
                     # persist via your helper
                     save_recipes(recipes)
-                    fetch_recipes.clear()                   # clear cache so recipes refetch
                     st.session_state["recipe_saved"] = True
                     st.rerun()
 
     if st.session_state.pop("recipe_saved", False):
         st.success("Recipe saved!")
 
-#______ 5. Ensure Goals Exist for New Users _______________
-def ensure_goals_exist(user_id:str):
-    existing = fetch_goals(user_id)
-    if existing:
-        return
-    supabase.table("macro_goals").insert({
-        "user_id": user_id,
-        "calories": 2000,
-        "protein": 150,
-        "carbs": 250,
-        "fat": 70
-    }).execute()
-
-def log_entry(food_name: str, macros: dict):
-    new_row = {
+def new_log_row(food_name: str, macros: dict) -> dict:
+    """A food_logs row stamped now, with its log_id fixed up front so re-sending it is harmless."""
+    return {
+        "log_id":   str(uuid.uuid4()),
         "user_id":  user_id,
         "date":     now.date().isoformat(),
         "time":     now.strftime("%-I:%M %p"),
@@ -441,10 +451,12 @@ def log_entry(food_name: str, macros: dict):
         "carbs":    macros["carbs"],
         "fat":      macros["fat"],
     }
+
+def log_entry(food_name: str, macros: dict):
     with st.spinner(f"Logging '{food_name}'…"):
-        res = supabase.table("food_logs").insert(new_row).execute()
+        saved = attempt("Error logging food", log_foods, user_id, [new_log_row(food_name, macros)])
+    if saved is not None:
         st.success(f"Logged “{food_name}”")
-        fetch_logs.clear()
         st.rerun()
 
 st.markdown(
@@ -464,7 +476,8 @@ st.markdown(
 
 
 # ------------------------- A. Login ---------------------------------------------
-if "user_id" not in st.session_state:
+@traced
+def render_login():
     st.sidebar.title("Login")
     st.sidebar.markdown("Enter your name to log in:")
     st.sidebar.caption(f"Version: {version}")
@@ -476,71 +489,58 @@ if "user_id" not in st.session_state:
     if not (login and username):
         st.stop()
     #______ 1) Look up existing user, or create a new user _______     
-    user_res = (supabase
-                .table("users")
-                .select("id")
-                .eq("username", username)
-                .single()
-                .execute()
-            )
-        
-    if user_res.data:
-        user_id = user_res.data["id"]
-    else:
-        user_id = str(uuid.uuid4())
-        supabase.table("users").insert({
-            "id": user_id,
-            "username": username
-        }).execute()
+    try:
+        user_id = resolve_user(username)
+    except APIError as e:
+        st.sidebar.error(f"Supabase error while logging in: {e}")
+        st.stop()
+    except CircuitOpen as e:
+        st.sidebar.warning(f"{e}; please try logging in again in a moment.")
+        st.stop()
     # ______ 2) Save 'user_id' & 'username' into session ______
     st.session_state["user_id"] = user_id
     st.session_state["username_cleaned"] = username
     st.rerun()
-# ______ 3) Load user data ______
-user_id = st.session_state["user_id"]
-ensure_goals_exist(user_id)
-macro_goals = fetch_goals(user_id)
-raw_recipes = fetch_recipes(user_id)
-food_logs = fetch_logs(user_id)
-
-logs_df = (pd.DataFrame(food_logs)
-           .reindex(columns=["log_id","date", "time", "food", "calories", "protein", "carbs", "fat"]))
-
-macro_resp = supabase.table("macro_goals")\
-                        .select("calories","protein","carbs","fat")\
-                        .eq("user_id", user_id)\
-                        .single()\
-                        .execute()
-if macro_resp.data: 
-    macro_goals = macro_resp.data
-else: 
-    macro_goals = {
-        "calories": 2000,
-        "protein": 150,
-        "carbs": 250,
-        "fat": 70
-    }
 
-recipe_resp = supabase.table("recipes")\
-                .select("*")\
-                .eq("user_id", user_id)\
-                .execute()
+# every login-page run ends in st.stop() or st.rerun(), so its trace is closed here
+if "user_id" not in st.session_state:
+    try:
+        render_login()
+    finally:
+        tracing.finish()
 
-if recipe_resp.data:
-    raw_recipes = recipe_resp.data
+# ______ 3) User data, loaded by the tab that needs it ______
+user_id = st.session_state["user_id"]
 
-st.session_state.setdefault("macro_goals", macro_goals)
-st.session_state["macro_goals"] = macro_goals
-st.session_state["recipes"] = raw_recipes
-st.session_state["food_logs"] = logs_df
+def user_data(*tables) -> dict:
+    """
+    The current user's {"goals", "recipes", "logs"} for the given tables.
+    Each render_* function asks for what it shows; tables not loaded yet are
+    fetched together, everything else comes from the per-user cache.
+    """
+    with span("user_data"):
+        return bootstrap(user_id, tables)
 
 st.title("Macro Tracker")
 st.markdown(f"Logged in as: `{st.session_state['username_cleaned']}`")
 
+with st.sidebar.expander("Export history"):
+    export_format = st.radio("Format", available_formats(), horizontal=True, key="export_format")
+    _, export_mime, export_ext = EXPORT_FORMATS[export_format]
+    # built only when clicked; Streamlit keeps the whole file in memory
+    st.download_button(
+        "Download full history",
+        data=lambda: export_bytes(user_id, export_format),
+        file_name=f"macro_log_{st.session_state['username_cleaned']}.{export_ext}",
+        mime=export_mime,
+    )
+
 #---------------------------------------------------------------------------------------------------
 #                           Tab1: Dashboard
 # --------------------------------------------------------------------------------------------------
+@traced
 def render_dashboard():
+    macro_goals = user_data("macro_goals", "food_logs")["goals"]
     st.header("Today's Progress")
     #----------------------------------------------------
     #  Defining macros and targets
@@ -549,17 +549,17 @@ def render_dashboard():
     targets = pd.Series(macro_goals)
 
     #----------------------------------------------------
-    #  2) Today's logs
+    #  2) Today's totals, straight from the per-day index
     # ---------------------------------------------------
     today = now.date().isoformat()
-    today_logs = logs_df[logs_df["date"] == today]
+    today_totals = day_totals(user_id, today)
 
     #----------------------------------------------------
     #  3) Totals (zeros if no entries) and percentages
     # ---------------------------------------------------
-    totals = today_logs[macros].sum().reindex(macros, fill_value = 0)
+    totals = pd.Series(today_totals).reindex(macros, fill_value = 0).round(1)
     percentages = (totals/targets * 100).round(1)
-    percentages = (percentages.replace([np.inf,-np.inf],0).fillna(0))
+    percentages = (percentages.replace([float("inf"), float("-inf")],0).fillna(0))
 
     #----------------------------------------------------
     #  4) Caption with targets
@@ -588,7 +588,7 @@ def render_dashboard():
     # ---------------------------------------------------
     goal_button_label = (
         "Edit Macro Goals" 
-        if st.session_state.get("macro_goals") 
+        if macro_goals
         else "Set Macro Goals") 
     if st.button(goal_button_label):
         st.session_state["editing_goals"] = True
@@ -601,30 +601,37 @@ def render_dashboard():
     #  Pie Chart
     # ---------------------------------------------------
     st.subheader("Macro Calorie Breakdown")
-    if not today_logs.empty:
-        macro_totals = today_logs[["protein","carbs","fat"]].sum()
+    chart_cache = get_chart_cache()
+    theme = st.get_option("theme.base")
+    if today_totals["entries"]:
+        macro_totals = today_totals
         macro_calories = {
             "Protein": macro_totals["protein"] * 4,
             "Carbs": macro_totals["carbs"] * 4,
             "Fat": macro_totals["fat"] * 9
         }
 
-        pie_df = pd.DataFrame({
-            "Macro": list(macro_calories.keys()),
-            "Calories": list(macro_calories.values())
-        })
-
-        fig = px.pie(pie_df, values='Calories', names='Macro',
-                hole=0.5,
-                color="Macro",
-                color_discrete_map={
-                    "Protein": "#6A5ACD",
-                    "Carbs": "#FFD700",
-                    "Fat": "#3CB371"
-                },
-                labels={'Calories': 'Calories', 'Macro': 'Macro'},
-                template='plotly_dark')
-        fig.update_traces(textposition='inside', textinfo='percent+label',textfont_size=14)
+        def macro_pie_chart():
+            import plotly.express as px
+            pie_df = pd.DataFrame({
+                "Macro": list(macro_calories.keys()),
+                "Calories": list(macro_calories.values())
+            })
+
+            fig = px.pie(pie_df, values='Calories', names='Macro',
+                    hole=0.5,
+                    color="Macro",
+                    color_discrete_map={
+                        "Protein": "#6A5ACD",
+                        "Carbs": "#FFD700",
+                        "Fat": "#3CB371"
+                    },
+                    labels={'Calories': 'Calories', 'Macro': 'Macro'},
+                    template='plotly_dark')
+            fig.update_traces(textposition='inside', textinfo='percent+label',textfont_size=14)
+            return fig
+
+        fig = chart_cache.get_or_build(content_key("macro_pie", macro_calories, theme), macro_pie_chart)
         st.plotly_chart(fig, use_container_width=False,width=300)
 
     else: 
@@ -635,16 +642,18 @@ def render_dashboard():
     st.subheader("Weekly Summary")
 
     seven_days_ago = now.date() - timedelta(days=6)
-    logs_df["date"] = pd.to_datetime(logs_df["date"]).dt.date
-    last_7_df = logs_df[logs_df["date"] >= seven_days_ago]
+    daily_totals = fetch_daily_totals(user_id, seven_days_ago.isoformat())
     #----------------------------------------------------
     #  Reordering to start the week on Sunday
     # ---------------------------------------------------
     all_days = pd.date_range(seven_days_ago, now.date())
     weekly_summary = (
-        last_7_df.groupby("date")[["calories", "protein","carbs","fat"]]
-        .sum()
-        .reindex(all_days, fill_value=0)
+        pd.DataFrame(
+            [daily_totals.get(d.date().isoformat(), {}) for d in all_days],
+            index=all_days,
+            columns=macros,
+        )
+        .fillna(0)
     )
     weekly_summary.index = pd.Categorical(
         [d.strftime("%a") for d in weekly_summary.index],
@@ -655,6 +664,7 @@ def render_dashboard():
     weekly_summary = weekly_summary.sort_index()
 
     def macro_bar_chart(chart_data, column, color, title):
+        import altair as alt
         chart_data = pd.DataFrame({
             "day": weekly_summary.index,
             column: weekly_summary[column].values
@@ -665,19 +675,28 @@ def render_dashboard():
             tooltip=["day", column]
         ).properties(width=250,height=300,title=title)
 
+    def macro_bar_spec(column, color, title):
+        # cached as a Vega-Lite spec so a hit skips both building and serializing
+        return chart_cache.get_or_build(
+            content_key("macro_bar", weekly_summary[column], color, title, theme),
+            lambda: macro_bar_chart(weekly_summary, column, color, title).to_dict(),
+        )
+
     col1, col2 = st.columns(2)
     with col1:
-        st.altair_chart(macro_bar_chart(weekly_summary, "calories", "#FF6F61", "Calories"), use_container_width=True)
-        st.altair_chart(macro_bar_chart(weekly_summary, "protein", "#6A5ACD", "Protein"), use_container_width=True)
+        st.vega_lite_chart(macro_bar_spec("calories", "#FF6F61", "Calories"), use_container_width=True)
+        st.vega_lite_chart(macro_bar_spec("protein", "#6A5ACD", "Protein"), use_container_width=True)
     with col2:  
-        st.altair_chart(macro_bar_chart(weekly_summary, "carbs", "#FFD700", "Carbs"), use_container_width=True)
-        st.altair_chart(macro_bar_chart(weekly_summary, "fat", "#3CB371", "Fats"), use_container_width=True)
+        st.vega_lite_chart(macro_bar_spec("carbs", "#FFD700", "Carbs"), use_container_width=True)
+        st.vega_lite_chart(macro_bar_spec("fat", "#3CB371", "Fats"), use_container_width=True)
                     
 #---------------------------------------------------------------------------------------------------
 #                           Tab2: Food Log
 # --------------------------------------------------------------------------------------------------
 
+@traced
 def render_food_log():
+    macro_goals = user_data("macro_goals", "food_logs")["goals"]
     col1, col2 = st.columns(2)
     with col1:
         if "recipe_expander_open" not in st.session_state:
@@ -690,23 +709,28 @@ def render_food_log():
             horizontal=True
         )
         if choice == "Recipes":
-            names = [r["recipe_name"] for r in raw_recipes]
+            recipes = recipe_index(user_id)
+            names = recipes.names
             sel = st.selectbox("Pick a recipe", ["—"] + names)
             if sel != "—":
-                rec = next(r for r in raw_recipes if r["recipe_name"] == sel)
+                rec = recipes.get(sel)
                 st.markdown(f"**Includes:** {', '.join(rec['foods'])}")
                 st.write(f"Calories: {rec['calories']}, Protein: {rec['protein']}g, Fat {rec['fat']}g, Carbs {rec['carbs']}g")
                 if st.button("Log Recipe"):
                     log_entry(rec["recipe_name"], rec)
                     st.success(f"Logged recipe “{sel}”!")
             with st.expander("Create a Recipe", expanded=st.session_state["recipe_expander_open"]):
+                render_nutrition_lookup({
+                    "food": "recipe_foods", "calories": "recipe_calories",
+                    "protein": "recipe_protein", "carbs": "recipe_carbs", "fat": "recipe_fat",
+                }, key="recipe_nutrition", accumulate=True)
                 with st.form("new_recipe_form", clear_on_submit=True):
                     name_input = st.text_input("Recipe Name")
-                    foods_input = st.text_input("Foods (comma-separated)")
-                    cals_input = st.number_input("Calories", min_value=0.0, step=1.0)
-                    protein_input = st.number_input("Protein (g)", min_value=0.0, step=1.0)
-                    carbs_input = st.number_input("Carbs (g)", min_value=0.0, step=1.0)
-                    fat_input = st.number_input("Fat (g)", min_value=0.0, step=1.0)
+                    foods_input = st.text_input("Foods (comma-separated)", key="recipe_foods")
+                    cals_input = st.number_input("Calories", min_value=0.0, step=1.0, key="recipe_calories")
+                    protein_input = st.number_input("Protein (g)", min_value=0.0, step=1.0, key="recipe_protein")
+                    carbs_input = st.number_input("Carbs (g)", min_value=0.0, step=1.0, key="recipe_carbs")
+                    fat_input = st.number_input("Fat (g)", min_value=0.0, step=1.0, key="recipe_fat")
                     r_save_btn = st.form_submit_button("Save Recipe")
                     if r_save_btn:
                         recipe_name = name_input.strip()
@@ -725,34 +749,63 @@ def render_food_log():
                                     "carbs": carbs_input,
                                     "fat": fat_input
                                 }
-                                save_recipes({recipe_name: new_recipe})
-                                fetch_recipes.clear()
+                                # save_recipes takes the full set; anything missing would be deleted
+                                all_recipes = {r["recipe_name"]: r for r in recipes.by_id.values()}
+                                save_recipes({**all_recipes, recipe_name: new_recipe})
                                 st.success(f"Created recipe {recipe_name}!")
                                 st.rerun()
         else:
-            with st.form("manual"):
-                food     = st.text_input("Food name")
-                calories = st.number_input("Calories", min_value=0.0)
-                protein  = st.number_input("Protein (g)", min_value=0.0)
-                carbs    = st.number_input("Carbs (g)", min_value=0.0)
-                fat      = st.number_input("Fat (g)", min_value=0.0)
-                submit   = st.form_submit_button("Log Food")
+            render_food_suggestions({
+                "food": "manual_food", "calories": "manual_calories",
+                "protein": "manual_protein", "carbs": "manual_carbs", "fat": "manual_fat",
+            }, key="manual_suggest")
+            render_nutrition_lookup({
+                "food": "manual_food", "calories": "manual_calories",
+                "protein": "manual_protein", "carbs": "manual_carbs", "fat": "manual_fat",
+            }, key="manual_nutrition")
+            with st.form("manual", clear_on_submit=True):
+                food     = st.text_input("Food name", key="manual_food")
+                calories = st.number_input("Calories", min_value=0.0, key="manual_calories")
+                protein  = st.number_input("Protein (g)", min_value=0.0, key="manual_protein")
+                carbs    = st.number_input("Carbs (g)", min_value=0.0, key="manual_carbs")
+                fat      = st.number_input("Fat (g)", min_value=0.0, key="manual_fat")
+                btn1, btn2 = st.columns(2)
+                submit   = btn1.form_submit_button("Log Food")
+                add      = btn2.form_submit_button("Add to meal")
+            macros = {"calories":calories, "protein":protein, "carbs": carbs, "fat":fat}
+            # meal builder: entries collect here and are logged in one bulk insert
+            meal = st.session_state.setdefault("meal_items", [])
+            if add and food.strip():
+                meal.append(new_log_row(food, macros))
             if submit:
-                log_entry(food, {"calories":calories, "protein":protein, "carbs": carbs, "fat":fat})
-                st.success(f"Logged “{food}”!")
+                log_entry(food, macros)
+            if meal:
+                st.caption("Meal so far: " + ", ".join(item["food"] for item in meal))
+                btn1, btn2 = st.columns(2)
+                if btn1.button(f"Log meal ({len(meal)} items)"):
+                    with st.spinner("Logging meal…"):
+                        # on failure the items keep their log_ids for a retry
+                        saved = attempt("Couldn’t log meal", log_foods, user_id, meal)
+                    if saved is not None:
+                        st.session_state["meal_items"] = []
+                        st.rerun()
+                if btn2.button("Clear meal"):
+                    st.session_state["meal_items"] = []
+                    st.rerun()
     with col2:
+        macros = ["calories", "protein", "carbs", "fat"]
         today = now.date().isoformat()
-        today_logs = logs_df[logs_df["date"] == today]
         st.header("Food Logged Today")
-        today_logs["time"] = pd.to_datetime(today_logs["time"], format="%H:%M:%S").dt.strftime("%-I:%M %p")
+        records = [
+            {**r, "time": display_time(r.get("time")), **{m: float(r.get(m) or 0) for m in macros}}
+            for r in day_entries(user_id, today)
+        ]
 #----------------------------------------------------
 #  Food log UI, Edit, and Delete
 # ---------------------------------------------------
-        if today_logs.empty:
+        if not records:
             st.info("No food logged today yet.")
         else:
-            # turn into list of dicts once
-            records = today_logs.to_dict(orient="records")
 
             for rec in records:
                 # 1) Build your expander header
@@ -760,72 +813,18 @@ def render_food_log():
 
                 with st.expander(header, expanded=False):
                     st.caption("Impact on macros goals")
-                    # 2) Prepare & style your Plotly figure
-                    mode     = st.get_option("theme.base")  # "light" or "dark"
-                    template = "plotly_white" if mode=="light" else "plotly_dark"
-
-                    fig = make_subplots(
-                        rows=1, cols=3,
-                        specs=[[{"type":"domain"}]*3],
-                        subplot_titles=[f"Protein: {rec['protein']} (g)", f"Carbs: {rec['carbs']} (g)", f"Fat: {rec['fat']} (g)"]
-                    )
-                    fig.update_layout(template=template, margin=dict(l=0,r=0,t=10,b=0), height=120, width=300, showlegend=False)
-
-                    colors = {
-                        "protein": ["#6A5ACD","#E0E0FF"],
-                        "carbs":   ["#FFD700","#FFF8B0"],
-                        "fat":     ["#3CB371","#B0EFB0"]
-                    }
-
-                    percentages = []
-                    for i, macro in enumerate(["protein","carbs","fat"], start=1):
-                        eaten     = float(rec[macro])
-                        goal      = float(macro_goals.get(macro,1))
-                        remaining = max(goal - eaten, 0)
-                        pct       = round(eaten/goal*100,1) if goal else 0
-                        percentages.append(pct)
-
-                        fig.add_trace(
-                            go.Pie(
-                                labels=["Eaten","Remaining"],
-                                values=[eaten, remaining],
-                                hole=0.68,
-                                sort= False,
-                                marker=dict(colors=colors[macro]),
-                                hoverinfo='none',
-                                textinfo='none'
-                            ),
-                            row=1, col=i
-                        )
-
-                    # center the % annotation in each donut
-                    for idx, trace in enumerate(fig.data):
-                        dom   = trace.domain
-                        mid_x = (dom.x[0] + dom.x[1]) / 2
-                        mid_y = (dom.y[0] + dom.y[1]) / 2
-                        fig.add_annotation(
-                            x=mid_x, y=mid_y,
-                            text=f"{percentages[idx]}%",
-                            showarrow=False,
-                            font=dict(size=16, color=("#000" if mode=="light" else "#fff")),
-                            xanchor="center", yanchor="middle"
-                        )
-                    fig.update_layout(
-                        margin=dict(l=0, r=0, t=20, b=0),   # more space at top
-                        height=140,                         # a bit shorter overall
-                        width=300,
-                        showlegend=False
+                    # 2) Three small SVG donuts, memoized per entry/goals/theme
+                    mode = st.get_option("theme.base")  # "light" or "dark"
+                    st.markdown(
+                        entry_donuts_html(
+                            rec["log_id"],
+                            tuple(rec[m] for m in ("protein", "carbs", "fat")),
+                            tuple(float(macro_goals.get(m, 1)) for m in ("protein", "carbs", "fat")),
+                            mode,
+                        ),
+                        unsafe_allow_html=True,
                     )
 
-                    # 2) Tweak each subplot‐title annotation
-                    for ann in fig.layout.annotations:
-                        # these first three are your subplot_titles
-                        if ann.text in ["Protein","Carbs","Fat"]:
-                            ann.font.size = 13              # smaller title font
-                            ann.y = ann.y           # nudge down a bit
-
-                    st.plotly_chart(fig, use_container_width=True, config={"staticPlot": True, "displayModeBar": False}, key=f"pies_{rec['log_id']}")
-
                     # 3) Action buttons for this entry
                     col1, col2 = st.columns(2)
                     with col1:
@@ -834,17 +833,8 @@ def render_food_log():
                             st.rerun()
                     with col2:
                         if st.button("Delete", key=f"del_{rec['log_id']}"):
-                            res = (
-                                supabase.table("food_logs")
-                                        .delete()
-                                        .eq("log_id", rec["log_id"])
-                                        .execute()
-                            )
-                            if res.error:
-                                st.error(f"Delete failed: {res.error.message}")
-                            else:
+                            if attempt("Delete failed", delete_rows, "food_logs", user_id, [rec["log_id"]]) is not None:
                                 st.success("Entry deleted.")
-                                fetch_logs.clear()
                                 st.rerun()
 
             # 4) Edit‐form outside the loop, triggered by the “Edit” button
@@ -862,23 +852,15 @@ def render_food_log():
                     save_btn    = st.form_submit_button("Save changes")
 
                 if save_btn:
-                    upd = (
-                        supabase.table("food_logs")
-                                .update({
-                                    "food":     new_food,
-                                    "calories": new_cal,
-                                    "protein":  new_protein,
-                                    "carbs":    new_carbs,
-                                    "fat":      new_fat
-                                })
-                                .eq("log_id", log_id)
-                                .execute()
-                    )
-                    if upd.error:
-                        st.error(f"Update failed: {upd.error.message}")
-                    else:
+                    changes = {
+                        "food":     new_food,
+                        "calories": new_cal,
+                        "protein":  new_protein,
+                        "carbs":    new_carbs,
+                        "fat":      new_fat
+                    }
+                    if attempt("Update failed", update_row, "food_logs", log_id, changes) is not None:
                         st.success("Entry updated.")
-                        fetch_logs.clear()
                         st.rerun()
 TAB_NAMES = ["Dashboard", "Food Log"]
 default = st.session_state.get("active_tab_index", 0)
@@ -894,8 +876,34 @@ selected = option_menu(
 # store so it survives any rerun
 st.session_state["active_tab_index"] = TAB_NAMES.index(selected)
 
-# dispatch
-if selected == "Dashboard":
-    render_dashboard()
-else:
-    render_food_log()
\ No newline at end of file
+# dispatch; a write ends its run with st.rerun(), so the trace is closed either way
+try:
+    if selected == "Dashboard":
+        render_dashboard()
+    else:
+        render_food_log()
+finally:
+    # close this run's trace (logged as JSON; see tracing.py)
+    rerun_trace = tracing.finish()
+
+# opt-in diagnostics: add ?debug=1 to the URL
+if st.query_params.get("debug"):
+    with st.sidebar.expander("Debug", expanded=True):
+        st.caption(f"This rerun: {rerun_trace['ms']} ms, {rerun_trace['calls']} Supabase calls "
+                   f"({rerun_trace['call_ms']} ms, {rerun_trace['bytes']:,} bytes)")
+        if rerun_trace["spans"]:
+            st.dataframe(pd.DataFrame(rerun_trace["spans"]), hide_index=True)
+        if rerun_trace["by_table"]:
+            st.dataframe(pd.DataFrame.from_dict(rerun_trace["by_table"], orient="index"))
+        st.caption("This user, since the server started")
+        st.json(tracing.get_trace_store().totals(user_id))
+        st.caption("Chart cache")
+        st.json(get_chart_cache().stats())
+        st.caption("Supabase client")
+        st.json(client_stats())
+        st.caption("User cache")
+        st.json(get_user_cache().stats())
+        mirror = mirror_stats()
+        if mirror is not None:
+            st.caption("Local mirror")
+            st.json(mirror)
@@ -0,0 +1,316 @@
+"""
+In-process stand-in for the supabase client, enough of the postgrest query
+builder for everything data.py does.  Every execute() sleeps `latency`
+seconds and is recorded in `calls`, so benchmarks see realistic round trips
+and can count them.
+"""
+import bisect
+import itertools
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from types import SimpleNamespace
+from postgrest.exceptions import APIError
+from logstore import MACROS, DEFAULT_GOALS
+
+PRIMARY_KEYS = {"users": "id", "macro_goals": "user_id", "recipes": "recipe_id", "food_logs": "log_id"}
+
+FOODS = [
+    "Eggs (2)", "Whey", "Rolled Oats", "Almond Milk", "Chicken Breast", "White Rice", "Broccoli",
+    "Greek Yogurt", "Banana", "Peanut Butter", "Salmon", "Sweet Potato", "Turkey Sandwich",
+    "Protein Bar", "Cottage Cheese", "Apple", "Ground Beef", "Pasta", "Avocado Toast", "Black Beans",
+]
+
+_KEYSET = re.compile(r"(\w+)\.gt\.([^,]+),and\((\w+)\.eq\.([^,]+),(\w+)\.gt\.([^)]+)\)")
+
+class _Query:
+    def __init__(self, db, table):
+        self.db, self.table = db, table
+        self.op, self.payload, self.kw = "select", None, {}
+        self.columns, self.filters, self.orders = "*", [], []
+        self.bounds, self.one = None, None
+        self.after = None       # (orders, key) of a keyset or_(), to seek instead of scan
+
+    # ______ Builder ______
+    def select(self, *columns, **kw):
+        self.columns = ",".join(columns) or "*"
+        return self
+
+    def _where(self, fn):
+        self.filters.append(fn)
+        return self
+
+    def eq(self, c, v):  return self._where(lambda r: str(r.get(c)) == str(v))
+    def neq(self, c, v): return self._where(lambda r: str(r.get(c)) != str(v))
+    def gt(self, c, v):  return self._where(lambda r: r.get(c) is not None and str(r[c]) > str(v))
+    def gte(self, c, v): return self._where(lambda r: r.get(c) is not None and str(r[c]) >= str(v))
+    def lt(self, c, v):  return self._where(lambda r: r.get(c) is not None and str(r[c]) < str(v))
+    def lte(self, c, v): return self._where(lambda r: r.get(c) is not None and str(r[c]) <= str(v))
+
+    def in_(self, c, values):
+        values = {str(v) for v in values}
+        return self._where(lambda r: str(r.get(c)) in values)
+
+    def or_(self, expr):
+        # only the keyset form data.iter_pages builds
+        a, av, _, _, b, bv = _KEYSET.match(expr).groups()
+        self.after = ((a, False), (b, False)), (av, bv)
+        return self._where(lambda r: str(r.get(a)) > av or (str(r.get(a)) == av and str(r.get(b)) > bv))
+
+    def order(self, column, desc=False, **kw):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, n):
+        self.bounds = (0, n - 1)
+        return self
+
+    def range(self, start, end):
+        self.bounds = (start, end)
+        return self
+
+    def single(self):
+        self.one = "single"
+        return self
+
+    def maybe_single(self):
+        self.one = "maybe"
+        return self
+
+    def insert(self, payload, **kw):
+        self.op, self.payload, self.kw = "insert", payload, kw
+        return self
+
+    def upsert(self, payload, **kw):
+        self.op, self.payload, self.kw = "upsert", payload, kw
+        return self
+
+    def update(self, payload, **kw):
+        self.op, self.payload = "update", payload
+        return self
+
+    def delete(self, **kw):
+        self.op = "delete"
+        return self
+
+    # ______ Execution ______
+    def execute(self):
+        self.db.record(self.table, self.op)
+        self.db.check_relation(self.table, writable=self.op != "select")
+        with self.db.lock:
+            if self.op == "select":
+                return self._select()
+            self.db.writes += 1
+            if self.op in ("insert", "upsert"):
+                return self._write()
+            rows = [r for r in self.db.rows(self.table) if all(f(r) for f in self.filters)]
+            if self.op == "update":
+                for r in rows:
+                    r.update(self.payload)
+                return SimpleNamespace(data=[dict(r) for r in rows])
+            if self.op == "delete":
+                gone = {id(r) for r in rows}
+                self.db.tables[self.table] = [r for r in self.db.rows(self.table) if id(r) not in gone]
+                return SimpleNamespace(data=[dict(r) for r in rows])
+
+    def _select(self):
+        # scan in result order and stop once the page is full, like an index scan
+        stop = min(self.bounds[1] + 1 if self.bounds else len(self.db.rows(self.table)),
+                   (self.bounds[0] if self.bounds else 0) + self.db.max_rows)
+        orders = tuple(self.orders)
+        ordered, keys = self.db.ordered(self.table, orders)
+        first = 0
+        if self.after and self.after[0] == orders:
+            first = bisect.bisect_right(keys, self.after[1])
+        rows = []
+        for r in itertools.islice(ordered, first, None):
+            if all(f(r) for f in self.filters):
+                rows.append(r)
+                if len(rows) >= stop:
+                    break
+        rows = rows[self.bounds[0]:] if self.bounds else rows
+        if self.columns != "*":
+            columns = [c.strip() for c in self.columns.split(",")]
+            rows = [{c: r.get(c) for c in columns} for r in rows]
+        else:
+            rows = [dict(r) for r in rows]
+        if self.one:
+            if rows:
+                return SimpleNamespace(data=rows[0])
+            if self.one == "maybe":
+                return None
+            raise APIError({"message": "JSON object requested, multiple (or no) rows returned", "code": "PGRST116"})
+        return SimpleNamespace(data=rows)
+
+    def _write(self):
+        items = self.payload if isinstance(self.payload, list) else [self.payload]
+        pk = PRIMARY_KEYS.get(self.table, "id")
+        key = self.kw.get("on_conflict") or pk
+        table = self.db.rows(self.table)
+        existing = {str(r.get(key)): r for r in table}
+        out = []
+        for item in items:
+            item = dict(item)
+            item.setdefault(pk, str(uuid.uuid4()))
+            current = existing.get(str(item.get(key)))
+            if current is None:
+                table.append(item)
+                existing[str(item.get(key))] = item
+                out.append(dict(item))
+            elif self.op == "insert":
+                raise APIError({"message": "duplicate key value violates unique constraint", "code": "23505"})
+            elif not self.kw.get("ignore_duplicates"):
+                current.update(item)
+                out.append(dict(current))
+        return SimpleNamespace(data=out)
+
+class _Rpc:
+    def __init__(self, db, name: str, params: dict):
+        self.db, self.name, self.params = db, name, params or {}
+
+    def execute(self):
+        self.db.record(self.name, "rpc")
+        fn = self.db.functions().get(self.name)
+        if fn is None:
+            raise APIError({"message": f"Could not find the function public.{self.name}", "code": "PGRST202"})
+        with self.db.lock:
+            self.db.writes += 1
+            return SimpleNamespace(data=fn(**self.params))
+
+class FakeSupabase:
+    """
+    tables: name → list of row dicts.  max_rows mimics PostgREST's response
+    cap, and a table the fake does not know fails with PGRST205, as a
+    missing relation does.  By default the database is one without the sql/
+    files applied: no daily_totals view and no functions, so the app takes
+    its fallbacks.  rollup=True adds the daily_totals view (a group-by over
+    food_logs) and rpcs=True the bootstrap_user and login_user functions.
+    """
+
+    def __init__(self, latency: float = 0.0, max_rows: int = 1000, rollup: bool = False, rpcs: bool = False):
+        self.latency = latency
+        self.max_rows = max_rows
+        self.rollup = rollup
+        self.rpcs = rpcs
+        self.tables = {}
+        self.calls = []
+        self.writes = 0         # bumped by every write; invalidates the sort cache
+        self._sorted = {}
+        self._rollup = None
+        self.lock = threading.RLock()
+
+    def check_relation(self, table: str, writable: bool = False):
+        views = {"daily_totals"} if self.rollup else set()
+        if table in PRIMARY_KEYS or (table in views and not writable):
+            return
+        raise APIError({"message": f"Could not find the table 'public.{table}' in the schema cache", "code": "PGRST205"})
+
+    def rows(self, table: str) -> list:
+        if table == "daily_totals":
+            return self._daily_totals()
+        return self.tables.setdefault(table, [])
+
+    def _daily_totals(self) -> list:
+        """The view in sql/daily_totals.sql: food_logs summed per user and day, rebuilt after writes."""
+        logs = self.rows("food_logs")
+        stamp = (id(logs), len(logs), self.writes)
+        if self._rollup is None or self._rollup[0] != stamp:
+            days = {}
+            for r in logs:
+                totals = days.setdefault((r["user_id"], str(r["date"])), dict.fromkeys(MACROS, 0.0))
+                for m in MACROS:
+                    totals[m] += float(r.get(m) or 0)
+            self._rollup = (stamp, [{"user_id": u, "date": d, **t} for (u, d), t in days.items()])
+        return self._rollup[1]
+
+    def ordered(self, table: str, orders: tuple) -> list:
+        """(rows sorted by `orders`, their sort keys), cached until the table changes."""
+        rows = self.rows(table)
+        if not orders:
+            return rows, []
+        key = (table, orders)
+        stamp = (id(rows), len(rows), self.writes)
+        hit = self._sorted.get(key)
+        if hit is None or hit[0] != stamp:
+            ordered = list(rows)
+            for column, desc in reversed(orders):
+                ordered.sort(key=lambda r: str(r.get(column)), reverse=desc)
+            keys = [tuple(str(r.get(c)) for c, _ in orders) for r in ordered]
+            hit = self._sorted[key] = (stamp, (ordered, keys))
+        return hit[1]
+
+    def record(self, table: str, op: str):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.calls.append((table, op))
+
+    def table(self, name: str) -> _Query:
+        return _Query(self, name)
+
+    def rpc(self, name: str, params=None) -> _Rpc:
+        return _Rpc(self, name, params)
+
+    # ______ Functions (sql/bootstrap_user.sql, sql/login_user.sql) ______
+    def functions(self) -> dict:
+        if not self.rpcs:
+            return {}
+        return {"bootstrap_user": self._bootstrap_user, "login_user": self._login_user}
+
+    def _default_goals(self, user_id: str) -> dict:
+        goals = self.rows("macro_goals")
+        for row in goals:
+            if row["user_id"] == user_id:
+                return row
+        row = {"user_id": user_id, **DEFAULT_GOALS}
+        goals.append(row)
+        return row
+
+    def _bootstrap_user(self, p_user_id: str, p_since: str = None) -> dict:
+        return {
+            "goals":   dict(self._default_goals(p_user_id)),
+            "recipes": [dict(r) for r in self.rows("recipes") if r["user_id"] == p_user_id],
+            "logs":    [dict(r) for r in self.rows("food_logs")
+                        if r["user_id"] == p_user_id and (p_since is None or str(r["date"]) >= p_since)],
+        }
+
+    def _login_user(self, p_username: str, p_user_id: str) -> str:
+        users = self.rows("users")
+        user = next((u for u in users if u["username"] == p_username), None)
+        if user is None:
+            user = {"id": p_user_id, "username": p_username}
+            users.append(user)
+        self._default_goals(user["id"])
+        return user["id"]
+
+def seed_user(db: FakeSupabase, username: str, n_logs: int, per_day: int = 8, seed: int = 0) -> str:
+    """Add a user with goals, a few recipes and n_logs food_logs ending today; returns the user id."""
+    rng = random.Random(seed)
+    user_id = str(uuid.UUID(int=rng.getrandbits(128)))
+    db.rows("users").append({"id": user_id, "username": username})
+    db.rows("macro_goals").append({"user_id": user_id, "calories": 2200, "protein": 160, "carbs": 230, "fat": 70})
+    for i in range(5):
+        db.rows("recipes").append({
+            "recipe_id": str(uuid.UUID(int=rng.getrandbits(128))), "user_id": user_id,
+            "recipe_name": f"Recipe {i}", "foods": rng.sample(FOODS, 3),
+            "calories": 400.0, "protein": 30.0, "carbs": 40.0, "fat": 12.0,
+        })
+    today = date.today()
+    logs = db.rows("food_logs")
+    for i in range(n_logs):
+        day = today - timedelta(days=i // per_day)
+        logs.append({
+            "log_id":   str(uuid.UUID(int=rng.getrandbits(128))),
+            "user_id":  user_id,
+            "date":     day.isoformat(),
+            "time":     f"{6 + (i % per_day) * 2:02d}:{rng.randrange(60):02d}:00",
+            "food":     rng.choice(FOODS),
+            "calories": float(rng.randrange(50, 700)),
+            "protein":  float(rng.randrange(0, 50)),
+            "carbs":    float(rng.randrange(0, 80)),
+            "fat":      float(rng.randrange(0, 30)),
+        })
+    return user_id
@@ -0,0 +1,119 @@
+"""
+Rerun-latency benchmark: drives app.py with Streamlit's AppTest against the
+in-process FakeSupabase and reports, per history size and tab, the cold
+(empty caches) and warm rerun times and how many backend calls each made.
+
+    python bench/rerun_bench.py                               # 1k/10k/100k rows, 20 ms latency
+    python bench/rerun_bench.py --sizes 1000 --latency-ms 0 --out report.json
+    python bench/rerun_bench.py --rollup --rpc                # with the sql/ view and functions
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+TABS = {"Dashboard": 0, "Food Log": 1}
+
+def _install_fake(latency: float, rollup: bool = False, rpcs: bool = False):
+    """Swap db.supabase for the fake before data.py (and so app.py) first imports it."""
+    os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+    os.environ.setdefault("SUPABASE_KEY", "bench")
+    import db
+    from fake_supabase import FakeSupabase
+    from tracing import traced_client
+    if "data" in sys.modules:
+        raise RuntimeError("data.py was imported before the fake client was installed")
+    fake = FakeSupabase(latency=latency, rollup=rollup, rpcs=rpcs)
+    db.supabase = traced_client(fake)
+    return fake
+
+def _clear_caches():
+    import streamlit as st
+    from charts import entry_donuts_html
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    entry_donuts_html.cache_clear()
+
+def _run(at, fake) -> dict:
+    before = len(fake.calls)
+    start = time.perf_counter()
+    at.run()
+    return {
+        "seconds":    round(time.perf_counter() - start, 4),
+        "calls":      len(fake.calls) - before,
+        "exceptions": [str(e.value) for e in at.exception],
+        "errors":     [str(e.value) for e in at.error],
+    }
+
+def bench_tab(fake, user_id: str, username: str, tab: str, warm_runs: int, timeout: float) -> dict:
+    from streamlit.testing.v1 import AppTest
+    _clear_caches()
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=timeout)
+    at.session_state["user_id"] = user_id
+    at.session_state["username_cleaned"] = username
+    at.session_state["active_tab_index"] = TABS[tab]
+
+    cold = _run(at, fake)
+    warm = [_run(at, fake) for _ in range(warm_runs)]
+    seconds = [w["seconds"] for w in warm]
+    return {
+        "cold": cold,
+        "warm": {
+            "median_seconds": round(statistics.median(seconds), 4),
+            "max_seconds":    max(seconds),
+            "calls":          max(w["calls"] for w in warm),
+            "exceptions":     sorted({e for w in warm for e in w["exceptions"]}),
+            "errors":         sorted({e for w in warm for e in w["errors"]}),
+        },
+    }
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma separated food_logs row counts")
+    parser.add_argument("--latency-ms", type=float, default=20, help="simulated round trip per query")
+    parser.add_argument("--warm-runs", type=int, default=5, help="warm reruns per tab")
+    parser.add_argument("--timeout", type=float, default=600, help="AppTest timeout per run, seconds")
+    parser.add_argument("--rollup", action="store_true", help="emulate the daily_totals view (sql/daily_totals.sql)")
+    parser.add_argument("--rpc", action="store_true", help="emulate the bootstrap_user and login_user functions")
+    parser.add_argument("--out", help="write the JSON report here as well as to stdout")
+    args = parser.parse_args(argv)
+
+    fake = _install_fake(args.latency_ms / 1000, rollup=args.rollup, rpcs=args.rpc)
+    from fake_supabase import seed_user
+
+    results = []
+    for size in [int(s) for s in args.sizes.split(",") if s]:
+        username = f"bench{size}"
+        user_id = seed_user(fake, username, size, seed=size)
+        for tab in TABS:
+            print(f"{size:>7} rows · {tab}…", file=sys.stderr)
+            results.append({"rows": size, "tab": tab,
+                            **bench_tab(fake, user_id, username, tab, args.warm_runs, args.timeout)})
+
+    report = {
+        "created":    datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python":     platform.python_version(),
+        "latency_ms": args.latency_ms,
+        "warm_runs":  args.warm_runs,
+        "rollup":     args.rollup,
+        "rpc":        args.rpc,
+        "results":    results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+    failed = any(r[run][problem] for r in results for run in ("cold", "warm") for problem in ("exceptions", "errors"))
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,209 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+import streamlit as st
+from db import setting
+
+MISSING = object()
+
+CACHE_MB  = 256         # default byte budget; MACRO_TRACKER_CACHE_MB overrides it
+MAX_STALE = 3600        # seconds an expired entry is kept for stale reads
+SAMPLE    = 32          # items measured when estimating the size of a long list
+
+def readonly(value):
+    """
+    The view of `value` that is cached and handed to every session: lists
+    become tuples and dicts mapping proxies.  Only the top level is wrapped:
+    the row dicts inside are shared, not copied, and are still mutable, so
+    callers must treat them as read-only.
+    """
+    if isinstance(value, list):
+        return tuple(value)
+    if isinstance(value, dict):
+        return MappingProxyType(value)
+    return value
+
+def approx_size(value, depth: int = 3) -> int:
+    """Estimated bytes held by `value`; long sequences are measured on an even sample."""
+    if hasattr(value, "memory_usage"):      # DataFrame / Series
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if hasattr(usage, "sum") else usage)
+    if hasattr(value, "nbytes"):            # numpy arrays
+        return int(value.nbytes)
+    size = sys.getsizeof(value)
+    if depth == 0 or isinstance(value, (str, bytes, int, float, bool, type(None))):
+        return size
+    if isinstance(value, (dict, MappingProxyType)):
+        return size + sum(approx_size(k, 0) + approx_size(v, depth - 1) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = list(value) if isinstance(value, (set, frozenset)) else value
+        if not items:
+            return size
+        step   = max(1, len(items) // SAMPLE)
+        sample = items[::step]
+        return size + sum(approx_size(v, depth - 1) for v in sample) * len(items) // len(sample)
+    if hasattr(value, "__dict__"):
+        return size + approx_size(vars(value), depth - 1)
+    return size
+
+class UserCache:
+    """
+    Per-user, per-table values shared by every session in the server process.
+    Entries are keyed by (user_id, table), so a write or invalidation for one
+    user never touches anyone else's cached data.
+
+    Values are stored as read-only views (see readonly) and returned without
+    copying.  The cache holds at most max_bytes (estimated with approx_size,
+    plus whatever watch() charges to an entry): past that the least recently
+    used entries are evicted.  Entries expire after ttl seconds but are kept
+    for stale reads until max_stale.
+    """
+
+    def __init__(self, ttl: float = 300, max_bytes: int = CACHE_MB * 1024 * 1024, max_stale: float = MAX_STALE):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_stale = max_stale
+        self._entries = OrderedDict()   # (user_id, table) → (stored_at, value, size), least recent first
+        self._bytes = 0
+        self._swept = time.monotonic()
+        self._lock = threading.RLock()
+        self._watched = {}              # table → (extra_bytes, on_evict), see watch()
+        self.hits = self.misses = 0
+        self.evictions = 0              # dropped to stay under max_bytes
+        self.expirations = 0            # dropped after max_stale
+        self.stale_served = 0           # expired values handed out because a reload failed
+
+    def watch(self, table: str, *, extra_bytes=None, on_evict=None):
+        """
+        Hooks for one table's entries.  extra_bytes(user_id) is memory held
+        elsewhere on behalf of a user's entry and is charged to its size (it
+        is called under the cache lock, so it must not take other locks);
+        on_evict(user_id) runs after the entry is evicted or expires, not
+        after invalidate().
+        """
+        with self._lock:
+            self._watched[table] = (extra_bytes, on_evict)
+
+    def _fresh(self, key):
+        """The live entry's value, marked recently used, or MISSING. Caller holds the lock."""
+        hit = self._entries.get(key)
+        if hit and time.monotonic() - hit[0] < self.ttl:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return hit[1]
+        self.misses += 1
+        return MISSING
+
+    def get(self, user_id: str, table: str, loader):
+        """Return the cached value, calling loader() on a miss or once the TTL has passed."""
+        with self._lock:
+            value = self._fresh((user_id, table))
+        if value is not MISSING:
+            return value
+        try:
+            value = loader()
+        except Exception:
+            # Supabase is failing: an expired value beats an error page
+            value = self.stale(user_id, table)
+            if value is MISSING:
+                raise
+            return value
+        return self.put(user_id, table, value)
+
+    def peek(self, user_id: str, table: str):
+        """Return the cached value without loading, or MISSING if absent or expired."""
+        with self._lock:
+            return self._fresh((user_id, table))
+
+    def stale(self, user_id: str, table: str):
+        """Return the cached value even if expired, or MISSING; counted in stale_served."""
+        with self._lock:
+            hit = self._entries.get((user_id, table))
+            if hit is None:
+                return MISSING
+            self.stale_served += 1
+            return hit[1]
+
+    def _store(self, key, stored_at: float, value):
+        view = readonly(value)
+        size = approx_size(view)
+        extra_bytes = self._watched.get(key[1], (None, None))[0]
+        if extra_bytes:
+            size += extra_bytes(key[0])
+        old  = self._entries.pop(key, None)
+        if old:
+            self._bytes -= old[2]
+        self._entries[key] = (stored_at, view, size)
+        self._bytes += size
+        return view
+
+    def put(self, user_id: str, table: str, value):
+        """Cache value and return the read-only view that was stored."""
+        with self._lock:
+            view = self._store((user_id, table), time.monotonic(), value)
+            dropped = self._evict()
+        self._notify(dropped)
+        return view
+
+    def update(self, user_id: str, table: str, fn):
+        """Replace a cached value with fn(value) in place; no-op when nothing is cached."""
+        key = (user_id, table)
+        with self._lock:
+            hit = self._entries.get(key)
+            if not hit:
+                return
+            self._store(key, hit[0], fn(hit[1]))
+            dropped = self._evict()
+        self._notify(dropped)
+
+    def invalidate(self, user_id: str, table: str):
+        with self._lock:
+            hit = self._entries.pop((user_id, table), None)
+            if hit:
+                self._bytes -= hit[2]
+
+    def _evict(self) -> list:
+        """Drop entries past max_stale, then LRU entries over max_bytes. Caller holds the lock."""
+        dropped = []
+        now = time.monotonic()
+        if now - self._swept >= self.ttl:
+            self._swept = now
+            for key in [k for k, (stored_at, _, _) in self._entries.items() if now - stored_at >= self.max_stale]:
+                self._bytes -= self._entries.pop(key)[2]
+                self.expirations += 1
+                dropped.append(key)
+        # the newest entry stays even if it alone is over budget
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            key, (_, _, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            dropped.append(key)
+        return dropped
+
+    def _notify(self, dropped: list):
+        for user_id, table in dropped:
+            on_evict = self._watched.get(table, (None, None))[1]
+            if on_evict:
+                on_evict(user_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries":      len(self._entries),
+                "bytes":        self._bytes,
+                "max_bytes":    self.max_bytes,
+                "hits":         self.hits,
+                "misses":       self.misses,
+                "hit_rate":     round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions":    self.evictions,
+                "expirations":  self.expirations,
+                "stale_served": self.stale_served,
+            }
+
+@st.cache_resource
+def get_user_cache() -> UserCache:
+    megabytes = setting("MACRO_TRACKER_CACHE_MB")
+    return UserCache(max_bytes=int(float(megabytes or CACHE_MB) * 1024 * 1024))
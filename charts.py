@@ -0,0 +1,104 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from math import pi
+import pandas as pd
+import streamlit as st
+
+# ______ Per-entry donuts ______
+# Each "Food Logged Today" entry shows how much of the protein/carbs/fat goal
+# it covers.  They are drawn as a few hundred bytes of inline SVG instead of a
+# Plotly figure per entry, and memoized on everything that affects the output,
+# so unchanged entries cost neither a rebuild nor a large figure payload.
+DONUT_COLORS = {
+    "protein": ("#6A5ACD", "#E0E0FF"),
+    "carbs":   ("#FFD700", "#FFF8B0"),
+    "fat":     ("#3CB371", "#B0EFB0"),
+}
+DONUT_RADIUS = 26
+DONUT_STROKE = 9
+
+def _donut(label: str, eaten: float, goal: float, colors, text_color: str) -> str:
+    pct  = round(eaten / goal * 100, 1) if goal else 0
+    circ = 2 * pi * DONUT_RADIUS
+    arc  = circ * min(eaten / goal, 1) if goal else 0
+    size = 2 * (DONUT_RADIUS + DONUT_STROKE)
+    c    = size / 2
+    return (
+        f'<div style="text-align:center;flex:1">'
+        f'<div style="font-size:13px;color:{text_color}">{label}</div>'
+        f'<svg width="{size}" height="{size}" viewBox="0 0 {size} {size}">'
+        f'<circle cx="{c}" cy="{c}" r="{DONUT_RADIUS}" fill="none" stroke="{colors[1]}" stroke-width="{DONUT_STROKE}"/>'
+        f'<circle cx="{c}" cy="{c}" r="{DONUT_RADIUS}" fill="none" stroke="{colors[0]}" stroke-width="{DONUT_STROKE}" '
+        f'stroke-dasharray="{arc:.2f} {circ:.2f}" transform="rotate(-90 {c} {c})"/>'
+        f'<text x="{c}" y="{c}" text-anchor="middle" dominant-baseline="central" '
+        f'font-size="14" fill="{text_color}">{pct}%</text>'
+        f'</svg></div>'
+    )
+
+@lru_cache(maxsize=1024)
+def entry_donuts_html(log_id, eaten: tuple, goals: tuple, theme: str) -> str:
+    """
+    eaten/goals: (protein, carbs, fat) for one log entry and the user's goals.
+    log_id is part of the key only so each entry keeps its own cache slot.
+    """
+    text_color = "#000" if theme == "light" else "#fff"
+    donuts = "".join(
+        _donut(f"{macro.capitalize()}: {value} (g)", float(value), float(goal), DONUT_COLORS[macro], text_color)
+        for macro, value, goal in zip(("protein", "carbs", "fat"), eaten, goals)
+    )
+    return f'<div style="display:flex;gap:8px;max-width:300px">{donuts}</div>'
+
+# ______ Dashboard chart cache ______
+# Dashboard figures depend only on their input series, goals and theme, so
+# they are built once per distinct content and reused across reruns and
+# sessions.  Keys are content hashes; the cache is bounded and evicts the
+# least recently used figure.
+def content_key(kind: str, *parts) -> str:
+    h = hashlib.blake2b(kind.encode(), digest_size=16)
+    for part in parts:
+        if isinstance(part, (pd.Series, pd.DataFrame)):
+            h.update(pd.util.hash_pandas_object(part, index=True).values.tobytes())
+            h.update(repr(list(part.columns) if isinstance(part, pd.DataFrame) else part.name).encode())
+        else:
+            h.update(repr(part).encode())
+    return h.hexdigest()
+
+class ChartCache:
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._specs = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get_or_build(self, key: str, build):
+        with self._lock:
+            if key in self._specs:
+                self._specs.move_to_end(key)
+                self.hits += 1
+                return self._specs[key]
+            self.misses += 1
+        spec = build()
+        with self._lock:
+            self._specs[key] = spec
+            self._specs.move_to_end(key)
+            while len(self._specs) > self.max_entries:
+                self._specs.popitem(last=False)
+                self.evictions += 1
+        return spec
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries":   len(self._specs),
+                "hits":      self.hits,
+                "misses":    self.misses,
+                "evictions": self.evictions,
+                "hit_rate":  round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+@st.cache_resource
+def get_chart_cache() -> ChartCache:
+    return ChartCache()
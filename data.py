@@ -1,39 +1,690 @@
+import contextvars
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
 import streamlit as st
-from db import supabase
+from db import supabase, CircuitOpen, iter_pages, PAGE_SIZE
 from postgrest import APIError
+from cache import get_user_cache, approx_size, MISSING
+from logstore import MACROS, DEFAULT_GOALS, DayIndex, FoodIndex, time_key
+from mirror import get_mirror, PRIMARY_KEYS
+from recipes import RecipeIndex
 
-@st.cache_data(ttl=300)
-def fetch_goals(user_id: str) -> dict:
-        res = supabase.table("macro_goals").select("*").eq("user_id", user_id).maybe_single().execute()
-        
-        if res is None:
-            st.error("No response from Supabase when fetching macro goals.")
+# ______ Local mirror ______
+# With MACRO_TRACKER_MIRROR set, reads and writes go to a local SQLite copy
+# (see mirror.py) and a background worker syncs it with Supabase.  When the
+# worker pulls remote changes, the affected per-user cache entries are dropped.
+def _on_mirror_change(user_id: str, tables: list):
+    cache = _user_cache()
+    for table in tables:
+        cache.invalidate(user_id, table)
+    if "food_logs" in tables:
+        cache.invalidate(user_id, "daily_totals")
+
+def _mirror():
+    return get_mirror(supabase, _on_mirror_change)
+
+def mirror_stats():
+    """Queued and rejected writes in the local mirror, or None when mirroring is off."""
+    mirror = _mirror()
+    return None if mirror is None else mirror.stats()
+
+def _mirrored(user_id: str):
+    """The mirror, with this user's data pulled into it, or None when mirroring is off."""
+    mirror = _mirror()
+    if mirror is not None:
+        mirror.track(user_id)
+    return mirror
+
+# ______ Paged reads ______
+# Whole-history reads go page by page through db.iter_pages (PostgREST
+# truncates every response at its max-rows setting).  Only the columns the
+# app uses are selected.
+GOAL_COLUMNS   = "user_id,calories,protein,carbs,fat"
+LOG_COLUMNS    = "log_id,user_id,date,time,food,calories,protein,carbs,fat"
+RECIPE_COLUMNS = "recipe_id,user_id,recipe_name,foods,calories,protein,carbs,fat"
+
+def iter_log_pages(user_id: str, *, columns: str = LOG_COLUMNS, start: str = None, end: str = None,
+                   page_size: int = PAGE_SIZE):
+    """Yield the user's food_logs dated start..end (inclusive) as lists of rows ordered by (date, log_id)."""
+    mirror = _mirrored(user_id)
+    if mirror is None:
+        yield from iter_pages("food_logs", user_id, columns=columns, order=("date", "log_id"),
+                              start=start, end=end, page_size=page_size)
+        return
+    rows = sorted(
+        (r for r in mirror.select("food_logs", user_id, since=start) if end is None or str(r["date"]) <= end),
+        key=lambda r: (str(r["date"]), str(r["log_id"])),
+    )
+    for i in range(0, len(rows), page_size):
+        yield rows[i:i + page_size]
+
+def iter_logs(user_id: str, *, start: str = None, end: str = None, page_size: int = PAGE_SIZE):
+    """The user's food_logs dated start..end, one row at a time, fetched a page at a time."""
+    for page in iter_log_pages(user_id, start=start, end=end, page_size=page_size):
+        yield from page
+
+# ______ Loaders ______
+# Each loader hits Supabase (or the local mirror) directly and raises on
+# failure; the fetch_* wrappers below serve them through the per-user cache.
+def _load_goals(user_id: str) -> dict:
+    mirror = _mirrored(user_id)
+    if mirror is not None:
+        return (mirror.select("macro_goals", user_id) or [{}])[0]
+    res = supabase.table("macro_goals").select(GOAL_COLUMNS).eq("user_id", user_id).maybe_single().execute()
+    # maybe_single() returns None rather than a response when no row exists
+    return (res.data if res is not None else None) or {}
+
+def _load_recipes(user_id: str) -> list:
+    mirror = _mirrored(user_id)
+    if mirror is not None:
+        return mirror.select("recipes", user_id)
+    return [row for page in iter_pages("recipes", user_id, columns=RECIPE_COLUMNS, order=("recipe_id",))
+            for row in page]
+
+# ______ Incremental log sync ______
+# Each user's food log history is kept for the life of the server process,
+# keyed by log_id.  The watermark is the latest `date` seen on the server:
+# a sync only pulls rows dated on or after it, and replaces every local row
+# from that day forward, so inserts, edits and deletes made since the last
+# sync are all picked up by one small delta query.
+# The delta cannot see changes dated before the watermark that were made by
+# another process (a second replica, importer.py back-filling old logs, the
+# mirror's peer).  The first sync after FULL_RESYNC seconds therefore re-reads
+# the whole history instead; until then those changes are missing here.
+FULL_RESYNC = 1800  # seconds
+
+@st.cache_resource
+def _log_history() -> dict:
+    """
+    user_id → {"rows": {log_id: row}, "watermark": iso date | None, "lock": Lock,
+               "days": DayIndex, "foods": FoodIndex, "resynced": monotonic time | None}
+    """
+    return {}
+
+_history_lock = threading.Lock()
+
+def _history_entry(user_id: str) -> dict:
+    history = _log_history()
+    with _history_lock:
+        return history.setdefault(
+            user_id,
+            {"rows": {}, "watermark": None, "lock": threading.Lock(),
+             "days": DayIndex(), "foods": FoodIndex(), "resynced": None},
+        )
+
+# The history is the bulk of a user's memory, so it is charged to their
+# food_logs cache entry and dropped with it; the next fetch, or the next read
+# of the per-day or food index (_loaded_history), reloads it in full.
+def _history_bytes(user_id: str) -> int:
+    # runs under the cache lock: reads sizes only, without taking entry["lock"]
+    entry = _log_history().get(user_id)
+    if entry is None:
+        return 0
+    return approx_size(entry["rows"], depth=0) + entry["days"].nbytes + entry["foods"].nbytes
+
+def _forget_history(user_id: str):
+    with _history_lock:
+        _log_history().pop(user_id, None)
+
+def _user_cache():
+    cache = get_user_cache()
+    cache.watch("food_logs", extra_bytes=_history_bytes, on_evict=_forget_history)
+    return cache
+
+def _loaded_history(user_id: str) -> dict:
+    """The user's history entry for the index readers, reloaded in full if it was evicted."""
+    entry = _log_history().get(user_id)
+    if entry is None:
+        # an empty entry would read as a day with nothing logged until the next sync
+        _user_cache().invalidate(user_id, "food_logs")
+        fetch_logs(user_id)
+        entry = _history_entry(user_id)
+    return entry
+
+# The per-day and food-name indexes follow every change to the history rows.
+def _index_add(entry: dict, row: dict):
+    entry["days"].add(row)
+    entry["foods"].add(row)
+
+def _index_remove(entry: dict, row: dict):
+    entry["days"].remove(row)
+    entry["foods"].remove(row)
+
+def _apply_log_delta(entry: dict, watermark, delta: list) -> list:
+    """
+    Replace the history from `watermark` onward (all of it when None) with
+    `delta`.  Only rows that changed are re-indexed.  Caller holds entry["lock"].
+    """
+    rows  = entry["rows"]
+    fresh = {row["log_id"]: row for row in delta}
+    for log_id in [k for k, r in rows.items()
+                   if (watermark is None or str(r["date"]) >= watermark) and fresh.get(k) != r]:
+        _index_remove(entry, rows.pop(log_id))
+    for log_id, row in fresh.items():
+        if log_id in rows:
+            if rows[log_id] == row:
+                continue
+            # an older local copy, dated before the watermark
+            _index_remove(entry, rows.pop(log_id))
+        rows[log_id] = row
+        _index_add(entry, row)
+
+    dates = [str(r["date"]) for r in delta]
+    if dates:
+        entry["watermark"] = max(dates + ([watermark] if watermark else []))
+    elif watermark is None:
+        entry["watermark"] = None
+    return list(rows.values())
+
+def sync_logs(user_id: str) -> list:
+    entry = _history_entry(user_id)
+    with entry["lock"]:
+        now  = time.monotonic()
+        full = entry["resynced"] is None or now - entry["resynced"] >= FULL_RESYNC
+        watermark = None if full else entry["watermark"]
+        rows = _apply_log_delta(entry, watermark, list(iter_logs(user_id, start=watermark)))
+        if full:
+            entry["resynced"] = now
+    _user_cache().invalidate(user_id, "daily_totals")
+    return rows
+
+def merge_log(user_id: str, row: dict):
+    """Apply an insert or edit made by this process to the local history."""
+    entry = _log_history().get(user_id)
+    if entry is None:
+        # nothing loaded: the next load reads the row from the server
+        _user_cache().invalidate(user_id, "daily_totals")
+        return
+    with entry["lock"]:
+        current = entry["rows"].get(row["log_id"])
+        merged  = {**(current or {}), **row}
+        entry["rows"][row["log_id"]] = merged
+        if current:
+            _index_remove(entry, current)
+        _index_add(entry, merged)
+        rows = list(entry["rows"].values())
+    _user_cache().update(user_id, "food_logs", lambda _: rows)
+    if current:
+        _shift_daily_totals(user_id, current, -1)
+    _shift_daily_totals(user_id, merged, +1)
+
+def drop_log(user_id: str, log_id):
+    """Apply a delete made by this process to the local history."""
+    entry = _log_history().get(user_id)
+    if entry is None:
+        _user_cache().invalidate(user_id, "daily_totals")
+        return
+    with entry["lock"]:
+        current = entry["rows"].pop(log_id, None)
+        if current:
+            _index_remove(entry, current)
+        rows = list(entry["rows"].values())
+    _user_cache().update(user_id, "food_logs", lambda _: rows)
+    if current:
+        _shift_daily_totals(user_id, current, -1)
+
+def day_totals(user_id: str, day: str) -> dict:
+    """{calories, protein, carbs, fat, entries} for one day, read from the per-day index."""
+    entry = _loaded_history(user_id)
+    with entry["lock"]:
+        return {**entry["days"].totals(day), "entries": len(entry["days"].log_ids(day))}
+
+def day_entries(user_id: str, day: str) -> list:
+    """The log rows for one day, in time order."""
+    entry = _loaded_history(user_id)
+    with entry["lock"]:
+        rows = [entry["rows"][log_id] for log_id in entry["days"].log_ids(day)]
+    return sorted(rows, key=lambda r: time_key(r.get("time")))
+
+def suggest_foods(user_id: str, query: str, limit: int = 8) -> list:
+    """Previously logged foods matching `query`, ranked by frequency and recency, with their last macros."""
+    entry = _loaded_history(user_id)
+    with entry["lock"]:
+        return entry["foods"].suggest(query, limit)
+
+# ______ Daily rollup ______
+# Per-day macro totals come from the `daily_totals` view (sql/daily_totals.sql)
+# so charts read one pre-aggregated row per day.  The cached window is patched
+# in place by merge_log/drop_log and dropped whenever a sync pulls a delta.
+# Without the view, the same totals are summed from the local log history.
+_rollup_missing = threading.Event()
+
+def _shift_daily_totals(user_id: str, row: dict, sign: int):
+    day = str(row.get("date"))
+
+    def patch(cached):
+        if day < cached["start"]:
+            return cached
+        totals = dict(cached["days"].get(day, dict.fromkeys(MACROS, 0.0)))
+        for m in MACROS:
+            totals[m] += sign * float(row.get(m) or 0)
+        return {"start": cached["start"], "days": {**cached["days"], day: totals}}
+
+    _user_cache().update(user_id, "daily_totals", patch)
+
+def _rollup_from_history(user_id: str, start: str) -> dict:
+    entry = _loaded_history(user_id)
+    with entry["lock"]:
+        return entry["days"].days_since(start)
+
+def _load_daily_totals(user_id: str, start: str) -> dict:
+    if not _rollup_missing.is_set() and _mirror() is None:
+        try:
+            days = {
+                str(r["date"]): {m: float(r[m] or 0) for m in MACROS}
+                for page in iter_pages("daily_totals", user_id, columns="date,calories,protein,carbs,fat",
+                                       order=("date",), start=start)
+                for r in page
+            }
+        except APIError as e:
+            if e.code not in ("PGRST205", "42P01"):   # relation not found
+                raise
+            _rollup_missing.set()
+        else:
+            return {"start": start, "days": days}
+
+    fetch_logs(user_id)  # make sure the local history is loaded
+    return {"start": start, "days": _rollup_from_history(user_id, start)}
+
+# ______ Concurrent fetch ______
+# The three post-login queries are independent, so on a cache miss they run
+# side by side on one bounded pool shared by every session in the process.
+FETCH_WORKERS = 8
+FETCH_TIMEOUT = 15  # seconds, per query
+
+USER_TABLES = ("macro_goals", "recipes", "food_logs")
+
+class UserData(NamedTuple):
+    goals: dict
+    recipes: list
+    logs: list
+
+@st.cache_resource
+def _fetch_pool() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="supabase-fetch")
+
+def fetch_user_data(user_id: str, timeout: float = FETCH_TIMEOUT, tables=USER_TABLES) -> UserData:
+    """
+    Run the goals, recipes and logs queries (those named in `tables`; the rest
+    come back as None) concurrently; raises TimeoutError if one is too slow.
+    """
+    _history_entry(user_id)  # create the history entry on the script thread
+    pool    = _fetch_pool()
+    loaders = {"macro_goals": _load_goals, "recipes": _load_recipes, "food_logs": sync_logs}
+    # each task runs in a copy of this context so its queries land in the rerun trace
+    futures = {t: pool.submit(contextvars.copy_context().run, loaders[t], user_id) for t in tables}
+    results = {t: f.result(timeout=timeout) for t, f in futures.items()}
+    return UserData(
+        goals=results.get("macro_goals"),
+        recipes=results.get("recipes"),
+        logs=results.get("food_logs"),
+    )
+
+def fetch_daily_totals(user_id: str, start: str) -> dict:
+    """Map iso date → {calories, protein, carbs, fat} for every logged day from `start` on."""
+    cache  = _user_cache()
+    cached = cache.peek(user_id, "daily_totals")
+    if cached is MISSING or cached["start"] > start:
+        try:
+            cached = _load_daily_totals(user_id, start)
+        except APIError as e:
+            st.error(f"Supabase error while fetching daily totals: {e}")
             return {}
-        
-        if hasattr(res,"error") and res.error:
-            st.error(f"Supabase error: {res.errormessage}")
+        except Exception as e:
+            st.error(f"Unexpected error while fetching daily totals: {e}")
             return {}
-        
-        return res.data or {}
+        cached = cache.put(user_id, "daily_totals", cached)
+    return {day: totals for day, totals in cached["days"].items() if day >= start}
+
+# ______ Cached reads ______
+def fetch_goals(user_id: str) -> dict:
+    try:
+        return _user_cache().get(user_id, "macro_goals", lambda: _load_goals(user_id))
+    except APIError as e:
+        st.error(f"Supabase error while fetching macro goals: {e}")
+    except Exception as e:
+        st.error(f"Unexpected error while fetching macro goals: {e}")
+    return {}
 
-@st.cache_data(ttl=300)
 def fetch_logs(user_id: str) -> list:
-    try:       
-        res = supabase.table("food_logs").select("*").eq("user_id", user_id).execute()
-        return res.data or {}
+    """
+    The user's whole food log history.  The tabs read single days and date
+    ranges from the per-day index (day_totals, day_entries, fetch_daily_totals)
+    instead, and the export pages through iter_log_pages.
+    """
+    try:
+        return _user_cache().get(user_id, "food_logs", lambda: sync_logs(user_id))
     except APIError as e:
         st.error(f"Supabase error while fetching food logs: {e}")
     except Exception as e:
         st.error(f"Unexpected error while fetching food logs: {e}")
-    return {}
+    return []
 
-@st.cache_data(ttl=300)
 def fetch_recipes(user_id: str) -> list:
-    try: 
-        res = supabase.table("recipes").select("*").eq("user_id", user_id).execute()
-        return res.data or {}
+    try:
+        return _user_cache().get(user_id, "recipes", lambda: _load_recipes(user_id))
     except APIError as e:
         st.error(f"Supabase error while fetching recipes: {e}")
     except Exception as e:
         st.error(f"Unexpected error while fetching recipes: {e}")
-    return {}
\ No newline at end of file
+    return []
+
+def recipe_index(user_id: str) -> RecipeIndex:
+    """The cached recipe list as a RecipeIndex, rebuilt only when that list is replaced."""
+    records = fetch_recipes(user_id)
+    cache   = _user_cache()
+    index   = cache.peek(user_id, "recipe_index")
+    if index is MISSING or index.source is not records:
+        index = RecipeIndex(records)
+        cache.put(user_id, "recipe_index", index)
+    return index
+
+# ______ Bootstrap ______
+# Everything the app needs after login, in one call.  When any piece is not
+# cached, the `bootstrap_user` RPC (sql/bootstrap_user.sql) returns goals,
+# recipes and the log delta since the sync watermark in a single round trip
+# and creates default goals for new users.  Deployments without the function
+# fall back to the individual loaders.
+_rpc_missing = threading.Event()
+
+def _create_default_goals(user_id: str) -> dict:
+    mirror = _mirror()
+    if mirror is not None:
+        return mirror.upsert("macro_goals", [{"user_id": user_id, **DEFAULT_GOALS}])[0]
+    res = (supabase.table("macro_goals")
+           .upsert({"user_id": user_id, **DEFAULT_GOALS}, on_conflict="user_id", ignore_duplicates=True)
+           .execute())
+    return (res.data or [None])[0] or _load_goals(user_id)
+
+def _load_bootstrap(user_id: str, tables=USER_TABLES) -> dict:
+    if not _rpc_missing.is_set() and _mirror() is None:
+        entry = _history_entry(user_id)
+        with entry["lock"]:
+            watermark = entry["watermark"]
+            try:
+                res = supabase.rpc("bootstrap_user", {"p_user_id": user_id, "p_since": watermark}).execute()
+            except APIError as e:
+                if e.code != "PGRST202":   # function not found
+                    raise
+                _rpc_missing.set()
+            else:
+                payload = res.data or {}
+                logs = _apply_log_delta(entry, watermark, payload.get("logs") or [])
+                _user_cache().invalidate(user_id, "daily_totals")
+                return {
+                    "macro_goals": payload.get("goals") or {},
+                    "recipes":     payload.get("recipes") or [],
+                    "food_logs":   logs,
+                }
+
+    # without the function only the tables asked for are loaded
+    fetched = fetch_user_data(user_id, tables=tables)
+    loaded  = {"recipes": fetched.recipes, "food_logs": fetched.logs}
+    if "macro_goals" in tables:
+        loaded["macro_goals"] = fetched.goals or _create_default_goals(user_id)
+    return {table: loaded[table] for table in tables}
+
+_RESULT_KEYS = {"macro_goals": "goals", "recipes": "recipes", "food_logs": "logs"}
+
+def bootstrap(user_id: str, tables=USER_TABLES) -> dict:
+    """
+    Return {"goals", "recipes", "logs"} for a user, limited to the keys for
+    `tables`, served from the per-user cache when warm.  Cold tables are
+    loaded together: in one round trip through bootstrap_user, or only the
+    missing ones concurrently without it.
+    """
+    cache  = _user_cache()
+    loaded = {table: cache.peek(user_id, table) for table in tables}
+    cold   = [table for table, value in loaded.items() if value is MISSING]
+    if cold:
+        try:
+            fresh = _load_bootstrap(user_id, cold)
+        except APIError as e:
+            st.error(f"Supabase error while loading your data: {e}")
+            fresh = None
+        except CircuitOpen as e:
+            st.warning(f"{e}; showing your last loaded data.")
+            fresh = None
+        except Exception as e:
+            st.error(f"Unexpected error while loading your data: {e}")
+            fresh = None
+        if fresh is None:
+            # last known values (however old) first, then defaults
+            fallback = {"macro_goals": dict(DEFAULT_GOALS), "recipes": [], "food_logs": []}
+            for table in cold:
+                stale = cache.stale(user_id, table)
+                loaded[table] = fallback[table] if stale is MISSING else stale
+            return {_RESULT_KEYS[t]: loaded[t] for t in tables}
+        # food_logs goes in first: storing another table could otherwise evict
+        # its expired entry, and the freshly synced history with it
+        order  = sorted(fresh, key=lambda table: table != "food_logs")
+        stored = {table: cache.put(user_id, table, fresh[table]) for table in order}
+        loaded.update({table: stored[table] for table in cold})
+
+    result = {_RESULT_KEYS[table]: value for table, value in loaded.items()}
+    if "goals" in result:
+        result["goals"] = {m: result["goals"].get(m, DEFAULT_GOALS[m]) for m in MACROS}
+    return result
+
+# ______ Write-through ______
+# Rows returned by a successful insert/upsert/update are folded into the
+# owning user's cached entry, so the next rerun reads them without a reload.
+def _merge_recipes(cached: list, rows: list) -> list:
+    by_id = {r["recipe_id"]: r for r in cached}
+    for row in rows:
+        by_id[row["recipe_id"]] = {**by_id.get(row["recipe_id"], {}), **row}
+    return list(by_id.values())
+
+def cache_rows(table: str, rows):
+    """Write rows that were just saved to `table` through to their users' cache entries."""
+    rows = rows if isinstance(rows, list) else [rows]
+    cache = _user_cache()
+    for row in rows:
+        user_id = row["user_id"]
+        if table == "food_logs":
+            merge_log(user_id, row)
+        elif table == "macro_goals":
+            cache.put(user_id, "macro_goals", row)
+        elif table == "recipes":
+            cache.update(user_id, "recipes", lambda cached, row=row: _merge_recipes(cached, [row]))
+
+def forget_rows(table: str, user_id: str, ids: list):
+    """Remove rows that were just deleted from `table` from the user's cache entry."""
+    if table == "food_logs":
+        for log_id in ids:
+            drop_log(user_id, log_id)
+    elif table == "recipes":
+        gone = set(ids)
+        _user_cache().update(
+            user_id, "recipes", lambda cached: [r for r in cached if r["recipe_id"] not in gone]
+        )
+
+def invalidate(user_id: str, table: str):
+    """Drop one user's cached copy of one table; the next fetch reloads it."""
+    _user_cache().invalidate(user_id, table)
+
+# ______ Writes ______
+# Every write goes through here so it lands in Supabase (or the mirror's
+# outbox) and in the owning user's cache in one step.  Failures raise APIError.
+def save_rows(table: str, rows, *, upsert: bool = False) -> list:
+    rows   = rows if isinstance(rows, list) else [rows]
+    mirror = _mirror()
+    if mirror is not None:
+        saved = mirror.upsert(table, rows)
+    elif upsert:
+        saved = supabase.table(table).upsert(rows).execute().data or []
+    else:
+        saved = supabase.table(table).insert(rows).execute().data or []
+    cache_rows(table, saved)
+    return saved
+
+def log_foods(user_id: str, rows: list) -> list:
+    """
+    Log several food entries with one bulk request.  Rows without a log_id get
+    one generated here, and the write is an upsert that ignores existing ids,
+    so the client retrying it after a timeout can never insert an entry twice.
+    """
+    rows   = [{"log_id": str(uuid.uuid4()), "user_id": user_id, **row} for row in rows]
+    mirror = _mirror()
+    if mirror is not None:
+        saved = mirror.upsert("food_logs", rows)
+    else:
+        res = (supabase.table("food_logs")
+               .upsert(rows, on_conflict="log_id", ignore_duplicates=True)
+               .execute())
+        # rows already written by an earlier attempt are not returned; keep ours
+        returned = {r["log_id"]: r for r in res.data or []}
+        saved = [returned.get(r["log_id"], r) for r in rows]
+    cache_rows("food_logs", saved)
+    return saved
+
+def update_row(table: str, key, changes: dict) -> list:
+    pk     = PRIMARY_KEYS[table]
+    mirror = _mirror()
+    if mirror is not None:
+        saved = mirror.upsert(table, [{pk: key, **changes}])
+    else:
+        saved = supabase.table(table).update(changes).eq(pk, key).execute().data or []
+    cache_rows(table, saved)
+    return saved
+
+def delete_rows(table: str, user_id: str, ids: list) -> list:
+    """Delete rows by primary key; returns the keys that were deleted."""
+    mirror = _mirror()
+    if mirror is not None:
+        mirror.delete(table, ids)
+    else:
+        supabase.table(table).delete().in_(PRIMARY_KEYS[table], ids).execute()
+    forget_rows(table, user_id, ids)
+    return ids
+
+# ______ Users ______
+# A username's id never changes, so it is resolved at most once per process
+# and kept in a bounded LRU shared by every session.  A cold lookup is one
+# call to login_user (sql/login_user.sql), which finds or creates the user
+# and their default goals atomically.  Without the function the user row is
+# written with an upsert that leaves an existing username alone, so two
+# first logins racing each other still end up with the same id; databases
+# without a unique index on users.username (which sql/login_user.sql adds)
+# get a lookup followed by an insert instead, which that race can duplicate.
+USER_IDS_MAX = 10_000
+
+class UserIds:
+    def __init__(self, max_entries: int = USER_IDS_MAX):
+        self.max_entries = max_entries
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, username: str):
+        with self._lock:
+            user_id = self._ids.get(username)
+            if user_id is None:
+                self.misses += 1
+                return None
+            self._ids.move_to_end(username)
+            self.hits += 1
+            return user_id
+
+    def put(self, username: str, user_id: str):
+        with self._lock:
+            self._ids[username] = user_id
+            self._ids.move_to_end(username)
+            while len(self._ids) > self.max_entries:
+                self._ids.popitem(last=False)
+
+@st.cache_resource
+def get_user_ids() -> UserIds:
+    return UserIds()
+
+_login_rpc_missing = threading.Event()
+
+def _find_user(username: str):
+    res = supabase.table("users").select("id").eq("username", username).maybe_single().execute()
+    return res.data["id"] if res is not None and res.data else None
+
+def _create_user(username: str) -> str:
+    row = {"id": str(uuid.uuid4()), "username": username}
+    try:
+        res = supabase.table("users").upsert(row, on_conflict="username", ignore_duplicates=True).execute()
+    except APIError as e:
+        if e.code != "42P10":   # users.username has no unique index to conflict on
+            raise
+    else:
+        # nothing returned: the username already exists (or a concurrent login just created it)
+        return res.data[0]["id"] if res.data else _find_user(username)
+    # without the index: look first, then insert
+    user_id = _find_user(username)
+    if user_id is not None:
+        return user_id
+    try:
+        return supabase.table("users").insert(row).execute().data[0]["id"]
+    except APIError as e:
+        if e.code != "23505":   # unique violation: created since we looked
+            raise
+        return _find_user(username)
+
+def _login(username: str) -> str:
+    if not _login_rpc_missing.is_set():
+        try:
+            res = supabase.rpc("login_user", {"p_username": username, "p_user_id": str(uuid.uuid4())}).execute()
+        except APIError as e:
+            if e.code != "PGRST202":   # function not found
+                raise
+            _login_rpc_missing.set()
+        else:
+            return res.data
+    return _create_user(username)
+
+def resolve_user(username: str) -> str:
+    """Return the user id for `username`, creating the user on first login."""
+    user_ids = get_user_ids()
+    user_id  = user_ids.get(username)
+    if user_id is not None:
+        return user_id
+    mirror = _mirror()
+    row = mirror.find_user(username) if mirror is not None else None
+    if row:
+        user_id = row["id"]
+    else:
+        user_id = _login(username)
+        if mirror is not None:
+            mirror.store("users", [{"id": user_id, "username": username}])
+    user_ids.put(username, user_id)
+    return user_id
+
+# ______ Recipe diff ______
+RECIPE_FIELDS = ["recipe_name", "foods", "calories", "protein", "carbs", "fat"]
+
+def recipe_hash(recipe: dict) -> str:
+    """Content hash of the user-editable recipe fields; 244 and 244.0 hash alike."""
+    content = {
+        f: (float(recipe[f] or 0) if f in MACROS else recipe.get(f))
+        for f in RECIPE_FIELDS
+    }
+    return hashlib.sha1(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+
+def diff_recipes(user_id: str, recipes_dict: dict, existing: list):
+    """
+    Compare the edited recipes (recipe_name → {foods, calories, protein, carbs, fat})
+    with the cached records.  Returns (rows to upsert, recipe_ids to delete):
+    only new or changed recipes are upserted, each with its recipe_id (new
+    ones get a generated id so the whole batch goes in one request).
+    """
+    by_name = {rec["recipe_name"]: rec for rec in existing}
+    to_upsert = []
+    for name, data in recipes_dict.items():
+        rec = {"user_id": user_id, "recipe_name": name, **{f: data[f] for f in RECIPE_FIELDS[1:]}}
+        current = by_name.get(name)
+        if current is not None and recipe_hash(current) == recipe_hash(rec):
+            continue
+        rec["recipe_id"] = current["recipe_id"] if current else str(uuid.uuid4())
+        to_upsert.append(rec)
+    removed = [rec["recipe_id"] for name, rec in by_name.items() if name not in recipes_dict]
+    return to_upsert, removed
@@ -1,7 +1,26 @@
+import logging
 import os
+import random
+import threading
+import time
+import httpx
 import streamlit as st
-from supabase import create_client, Client
+from postgrest.exceptions import APIError
+from supabase import create_client, Client, ClientOptions
 from streamlit.runtime.secrets import StreamlitSecretNotFoundError
+from tracing import traced_client
+
+log = logging.getLogger(__name__)
+
+def setting(name: str):
+    """An optional setting from the environment, else st.secrets; None when unset."""
+    value = os.getenv(name)
+    if not value:
+        try:
+            value = st.secrets.get(name)
+        except StreamlitSecretNotFoundError:
+            pass
+    return value
 
 @st.cache_resource
 def get_supabase_client() -> Client:
@@ -25,6 +44,211 @@ def get_supabase_client() -> Client:
             "• On Render: set them under Service → Environment → Environment Variables"
         )
 
-    return create_client(url, key)
+    # 4) One keep-alive pool and explicit timeouts shared by every session
+    options = ClientOptions(httpx_client=httpx.Client(
+        http2=True,
+        follow_redirects=True,
+        timeout=httpx.Timeout(_number("SUPABASE_TIMEOUT", 10), connect=_number("SUPABASE_CONNECT_TIMEOUT", 3)),
+        limits=httpx.Limits(
+            max_connections=int(_number("SUPABASE_POOL_SIZE", 20)),
+            max_keepalive_connections=int(_number("SUPABASE_POOL_SIZE", 20)),
+            keepalive_expiry=30,
+        ),
+    ))
+    return create_client(url, key, options)
+
+def _number(name: str, default: float) -> float:
+    value = setting(name)
+    return float(value) if value else default
+
+# ______ Retries and circuit breaker ______
+# Idempotent calls (selects, ignore-duplicates upserts and the RPCs listed
+# below) that fail on the network or with a transient database error are
+# retried with jittered exponential backoff.  Failures that survive their retries count towards the breaker:
+# after BREAKER_THRESHOLD in a row it opens and every call fails fast with
+# CircuitOpen for BREAKER_COOLDOWN seconds, then one trial call is let
+# through.  Callers going through cache.UserCache get the last cached value
+# instead of an error while Supabase is unavailable.
+READ_RETRIES      = 3
+RETRY_BASE        = 0.2     # seconds; attempt n waits up to RETRY_BASE * 2**n
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN  = 30      # seconds
+IDEMPOTENT_RPCS   = {"bootstrap_user", "login_user"}
+TRANSIENT_SQLSTATE = ("08", "53", "57")     # connection, resources, operator (e.g. statement timeout)
+
+class CircuitOpen(Exception):
+    """Supabase is marked unavailable; the call was not attempted."""
+
+    def __init__(self, message: str = "Supabase is unavailable right now"):
+        super().__init__(message)
+
+def is_transient(e: Exception) -> bool:
+    if isinstance(e, httpx.TransportError):
+        return True
+    return isinstance(e, APIError) and str(e.code or "").startswith(TRANSIENT_SQLSTATE)
+
+class Resilience:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.failures = 0           # consecutive failed calls
+        self.opened_at = None
+        self.trial = False          # a half-open trial call is in flight
+        self.stats = dict.fromkeys(("calls", "retries", "failures", "short_circuited", "opened"), 0)
+
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            return "open" if time.monotonic() - self.opened_at < BREAKER_COOLDOWN else "half-open"
+
+    def _admit(self):
+        with self._lock:
+            self.stats["calls"] += 1
+            if self.opened_at is None:
+                return
+            if time.monotonic() - self.opened_at >= BREAKER_COOLDOWN and not self.trial:
+                self.trial = True
+                return
+            self.stats["short_circuited"] += 1
+        raise CircuitOpen()
+
+    def _record(self, ok: bool):
+        with self._lock:
+            self.trial = False
+            if ok:
+                self.failures, self.opened_at = 0, None
+                return
+            self.failures += 1
+            self.stats["failures"] += 1
+            if self.failures >= BREAKER_THRESHOLD or self.opened_at is not None:
+                if self.opened_at is None:
+                    log.warning("Supabase circuit opened after %s failures", self.failures)
+                    self.stats["opened"] += 1
+                self.opened_at = time.monotonic()
+
+    def call(self, execute, retry: bool):
+        self._admit()
+        attempts = READ_RETRIES if retry else 1
+        for attempt in range(attempts):
+            try:
+                res = execute()
+            except Exception as e:
+                if not is_transient(e):
+                    self._record(True)   # the server answered; it is up
+                    raise
+                if attempt == attempts - 1:
+                    self._record(False)
+                    raise
+                with self._lock:
+                    self.stats["retries"] += 1
+                time.sleep(random.uniform(0, RETRY_BASE * 2 ** attempt))
+            else:
+                self._record(True)
+                return res
+
+    def snapshot(self) -> dict:
+        return {"breaker": self.state(), **self.stats}
+
+class _ResilientQuery:
+    def __init__(self, builder, resilience: Resilience, retry: bool):
+        self._builder = builder
+        self._resilience = resilience
+        self._retry = retry
+
+    def execute(self):
+        return self._resilience.call(self._builder.execute, self._retry)
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            return attr
+        def call(*args, **kwargs):
+            # selects are retried, and upserts that leave existing rows alone
+            # (retrying one cannot write anything twice); other writes are not
+            retry = self._retry and (
+                name not in ("insert", "upsert", "update", "delete")
+                or (name == "upsert" and kwargs.get("ignore_duplicates", False))
+            )
+            out = attr(*args, **kwargs)
+            return _ResilientQuery(out, self._resilience, retry) if hasattr(out, "execute") else out
+        return call
+
+class ResilientClient:
+    """A supabase client whose queries go through one Resilience (retries + breaker)."""
+
+    def __init__(self, client, resilience: Resilience):
+        self._client = client
+        self.resilience = resilience
+
+    def table(self, name: str):
+        return _ResilientQuery(self._client.table(name), self.resilience, True)
+
+    def rpc(self, fn: str, *args, **kwargs):
+        return _ResilientQuery(self._client.rpc(fn, *args, **kwargs), self.resilience, fn in IDEMPOTENT_RPCS)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+@st.cache_resource
+def get_resilience() -> Resilience:
+    return Resilience()
+
+def pool_stats() -> dict:
+    """Connections in the shared HTTP pool: open, idle, and the configured limit."""
+    transport = get_supabase_client().postgrest.session._transport
+    pool = getattr(transport, "_pool", None)
+    if pool is None:
+        return {}
+    connections = list(pool.connections)
+    return {
+        "open":  len(connections),
+        "idle":  sum(1 for c in connections if c.is_idle()),
+        "limit": pool._max_connections,
+    }
+
+def client_stats() -> dict:
+    return {**get_resilience().snapshot(), "pool": pool_stats()}
+
+# ______ Paged reads ______
+# PostgREST silently truncates every response at its max-rows setting (1000
+# by default), so reads that may cover a user's whole history go page by
+# page.  Pages are keyset-paginated: each one starts right after the last
+# row of the previous page on the table's sort key, so rows inserted
+# meanwhile never shift or repeat a page, and every page is one index range
+# scan.
+PAGE_SIZE = 1000   # keep at or below the server's max-rows
+
+def iter_pages(table: str, user_id: str, *, columns: str, order: tuple, start: str = None,
+               end: str = None, page_size: int = PAGE_SIZE, client=None):
+    """
+    Yield a user's rows of `table` as lists of at most page_size, ordered by
+    `order` (one or two columns, which must be unique together and selected).
+    start/end bound the `date` column, inclusive.  `client` defaults to the
+    shared one below.
+    """
+    client = client or supabase
+    after = None
+    while True:
+        query = client.table(table).select(columns).eq("user_id", user_id)
+        if start is not None:
+            query = query.gte("date", start)
+        if end is not None:
+            query = query.lte("date", end)
+        if after is not None:
+            if len(order) == 1:
+                query = query.gt(order[0], after[0])
+            else:
+                first, second = order
+                query = query.or_(f"{first}.gt.{after[0]},and({first}.eq.{after[0]},{second}.gt.{after[1]})")
+        for column in order:
+            query = query.order(column)
+        page = query.limit(page_size).execute().data or []
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        after = tuple(page[-1][column] for column in order)
 
-supabase: Client = get_supabase_client()
\ No newline at end of file
+# every table()/rpc() execute() is retried/guarded as above and recorded in
+# the current rerun trace (see tracing.py)
+supabase: Client = traced_client(ResilientClient(get_supabase_client(), get_resilience()))
\ No newline at end of file
@@ -0,0 +1,137 @@
+"""
+Export a user's full food log history as CSV or Parquet.
+
+    python export.py --user carl -o history.csv
+    python export.py --user carl --format parquet --start 2025-01-01 -o 2025.parquet
+
+Rows are read with data.iter_log_pages and each page is encoded and written
+as soon as it arrives, so the CLI's memory stays bounded by one page however
+long the history is.  The app's download button needs the whole file as
+bytes (export_bytes), which Streamlit holds in memory anyway.
+"""
+import argparse
+import csv
+import io
+import sys
+from importlib.util import find_spec
+from logstore import MACROS
+
+EXPORT_COLUMNS = ["date", "time", "food", *MACROS, "log_id"]
+
+# ______ Encoders ______
+# Each takes an iterable of row pages and yields encoded chunks of bytes.
+def iter_csv(pages):
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=EXPORT_COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    for page in pages:
+        writer.writerows(page)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+class _Drain(io.RawIOBase):
+    """Write-only sink that hands back what was written since the last take()."""
+
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def take(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        return out
+
+def _parquet_row(row: dict) -> dict:
+    text = {c: None if row.get(c) is None else str(row[c]) for c in ("date", "time", "food", "log_id")}
+    return {**text, **{m: float(row.get(m) or 0) for m in MACROS}}
+
+def iter_parquet(pages):
+    """One row group per page."""
+    # optional, and slow to import: only loaded when a Parquet export runs
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow") from None
+    schema = pa.schema(
+        [("date", pa.string()), ("time", pa.string()), ("food", pa.string())]
+        + [(m, pa.float64()) for m in MACROS]
+        + [("log_id", pa.string())]
+    )
+    sink = _Drain()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for page in pages:
+            writer.write_table(pa.Table.from_pylist([_parquet_row(r) for r in page], schema=schema))
+            yield sink.take()
+    yield sink.take()
+
+FORMATS = {
+    # format → (encoder, mime type, file extension)
+    "csv":     (iter_csv, "text/csv", "csv"),
+    "parquet": (iter_parquet, "application/vnd.apache.parquet", "parquet"),
+}
+
+def available_formats() -> list:
+    return [f for f in FORMATS if f != "parquet" or find_spec("pyarrow") is not None]
+
+# ______ Export ______
+def iter_export(user_id: str, fmt: str = "csv", *, start: str = None, end: str = None):
+    """Encoded chunks of the user's history dated start..end."""
+    from data import iter_log_pages
+    encode = FORMATS[fmt][0]
+    return encode(iter_log_pages(user_id, columns=",".join(EXPORT_COLUMNS), start=start, end=end))
+
+def write_export(user_id: str, out, fmt: str = "csv", **window) -> int:
+    """Stream the export into the binary file object `out`; returns the bytes written."""
+    written = 0
+    for chunk in iter_export(user_id, fmt, **window):
+        out.write(chunk)
+        written += len(chunk)
+    return written
+
+def export_bytes(user_id: str, fmt: str = "csv", **window) -> bytes:
+    """The whole export as bytes, the payload type st.download_button accepts."""
+    out = io.BytesIO()
+    write_export(user_id, out, fmt, **window)
+    return out.getvalue()
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Export a user's food log history.")
+    parser.add_argument("--user", required=True, help="username to export")
+    parser.add_argument("--format", choices=list(FORMATS), default="csv")
+    parser.add_argument("--start", help="first date to include (YYYY-MM-DD)")
+    parser.add_argument("--end", help="last date to include (YYYY-MM-DD)")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    from db import supabase
+    res = supabase.table("users").select("id").eq("username", args.user).maybe_single().execute()
+    if res is None or not res.data:
+        print(f"no such user: {args.user}", file=sys.stderr)
+        return 1
+    user_id = res.data["id"]
+
+    if args.output:
+        with open(args.output, "wb") as out:
+            size = write_export(user_id, out, args.format, start=args.start, end=args.end)
+        print(f"wrote {size} bytes to {args.output}", file=sys.stderr)
+    else:
+        write_export(user_id, sys.stdout.buffer, args.format, start=args.start, end=args.end)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
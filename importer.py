@@ -0,0 +1,300 @@
+"""
+Import the legacy CSV/JSON data files into Supabase.
+
+    python importer.py --user carl                  # everything under data/ and config/
+    python importer.py --user carl data/food_log.csv
+    python importer.py --user carl --dry-run
+
+Food logs are streamed from the CSVs in batches, so memory stays bounded by
+--batch however long the history is.  Every imported row gets a deterministic
+id (uuid5 of user, file and line), and rows are written with upserts that
+ignore existing ids, so re-running an import never duplicates anything.
+Progress is checkpointed per file after each batch in --state; an
+interrupted import picks up after the last batch that was written.
+"""
+import argparse
+import csv
+import glob
+import json
+import logging
+import math
+import os
+import sys
+import uuid
+from datetime import date, datetime
+from logstore import MACROS, DEFAULT_GOALS
+
+log = logging.getLogger("importer")
+
+ROOT          = os.path.dirname(os.path.abspath(__file__))
+NAMESPACE     = uuid.UUID("6f1c3a52-8d0e-4b8e-9a57-2f4f0c1d9e11")
+BATCH_SIZE    = 1000
+DEFAULT_TIME  = "12:00 AM"
+
+# ______ Sources ______
+def owner(path: str) -> str:
+    """'data/logs/Carl_macro_log.csv' → 'carl'; '' for files not tied to a user."""
+    name = os.path.basename(path)
+    for suffix in ("_macro_log.csv", "_goals.json", "_recipes.json"):
+        if name.endswith(suffix):
+            return name[: -len(suffix)].casefold()
+    return ""
+
+def kind(path: str) -> str:
+    name = os.path.basename(path)
+    if name.endswith(".csv"):
+        return "food_logs"
+    if name.endswith("goals.json"):
+        return "macro_goals"
+    return "recipes"
+
+SHARED_FILES = ["config/macro_goals.json", "data/food_log.csv"]
+
+def discover(root: str, username: str) -> list:
+    """
+    The legacy files that belong to `username`, in import order.  The shared
+    files (config/macro_goals.json, data/food_log.csv) are taken as theirs
+    too; a per-user goals file is listed after config/ so it wins.
+    """
+    patterns = [
+        "config/macro_goals.json",
+        "data/logs/*_goals.json",
+        "data/recipes/*_recipes.json",
+        "data/food_log.csv",
+        "data/logs/*_macro_log.csv",
+    ]
+    found = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(os.path.join(root, pattern))):
+            # "_goals.json" was saved before a username was set; it belongs to nobody
+            if pattern in SHARED_FILES or owner(path) == username.casefold() != "":
+                found.append(path)
+    return found
+
+# ______ Normalization ______
+def _macro(value) -> float:
+    number = float(value)
+    if not math.isfinite(number) or number < 0:
+        raise ValueError(f"bad macro value {value!r}")
+    return round(number, 2)
+
+def _time(value) -> str:
+    """Any legacy time → the app's '8:30 AM' format; missing times become midnight."""
+    value = (value or "").strip()
+    if not value:
+        return DEFAULT_TIME
+    for fmt in ("%I:%M %p", "%H:%M:%S", "%H:%M"):
+        try:
+            return datetime.strptime(value, fmt).strftime("%-I:%M %p")
+        except ValueError:
+            pass
+    raise ValueError(f"bad time {value!r}")
+
+def log_row(user_id: str, source: str, line: int, raw: dict) -> dict:
+    """
+    One food_logs row from a CSV record.  Older files have a misspelled
+    `protien` column next to `protein`; `protein` wins when both are filled.
+    Raises ValueError for rows that cannot be imported.
+    """
+    food = (raw.get("food") or "").strip()
+    if not food:
+        raise ValueError("missing food")
+    day = date.fromisoformat((raw.get("date") or "").strip()).isoformat()
+    raw = {**raw, "protein": raw.get("protein") or raw.get("protien")}
+    return {
+        "log_id":  str(uuid.uuid5(NAMESPACE, f"{user_id}:{source}:{line}")),
+        "user_id": user_id,
+        "date":    day,
+        "time":    _time(raw.get("time")),
+        "food":    food,
+        **{m: _macro(raw.get(m) or 0) for m in MACROS},
+    }
+
+def goals_row(user_id: str, raw: dict) -> dict:
+    return {"user_id": user_id, **{m: _macro(raw[m]) for m in MACROS}}
+
+def recipe_row(user_id: str, name: str, raw: dict) -> dict:
+    foods = raw.get("foods") or []
+    if isinstance(foods, str):
+        foods = [f.strip() for f in foods.split(",") if f.strip()]
+    return {
+        "recipe_id":   str(uuid.uuid5(NAMESPACE, f"{user_id}:recipe:{name}")),
+        "user_id":     user_id,
+        "recipe_name": name,
+        "foods":       foods,
+        **{m: _macro(raw.get(m) or 0) for m in MACROS},
+    }
+
+# ______ Checkpoints ______
+class Checkpoint:
+    """file → last line written, persisted atomically after every batch."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.state = {}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.state = json.load(f)
+
+    def start(self, user_id: str, source: str, size: int) -> int:
+        done = self.state.get(f"{user_id}:{source}")
+        if not done or done["size"] > size:
+            return 0    # new file, or rewritten since the last run
+        return done["line"]
+
+    def advance(self, user_id: str, source: str, line: int, size: int):
+        self.state[f"{user_id}:{source}"] = {"line": line, "size": size}
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp, self.path)
+
+# ______ Writes ______
+def write(client, table: str, rows: list, on_conflict: str, ignore_duplicates: bool = True):
+    """
+    Bulk upsert that leaves existing rows alone (unless told otherwise).  With
+    ignore_duplicates the write is idempotent, so db's client retries it on
+    connection errors.
+    """
+    return (client.table(table)
+            .upsert(rows, on_conflict=on_conflict, ignore_duplicates=ignore_duplicates)
+            .execute())
+
+class Importer:
+    def __init__(self, client, user_id: str, *, root: str = ROOT, batch: int = BATCH_SIZE,
+                 checkpoint: Checkpoint = None, dry_run: bool = False):
+        self.client     = client
+        self.user_id    = user_id
+        self.root       = root
+        self.batch      = batch
+        self.checkpoint = checkpoint or Checkpoint(None)
+        self.dry_run    = dry_run
+        self.stats      = {}
+
+    def _count(self, table: str, field: str, n: int = 1):
+        counts = self.stats.setdefault(table, {"imported": 0, "skipped": 0, "invalid": 0})
+        counts[field] += n
+
+    def _flush(self, table: str, rows: list, on_conflict: str, ignore_duplicates: bool = True):
+        written = len(rows)
+        if rows and not self.dry_run:
+            # rows the server already had are not returned
+            written = len(write(self.client, table, rows, on_conflict, ignore_duplicates).data or [])
+        self._count(table, "imported", written)
+        self._count(table, "skipped", len(rows) - written)
+
+    def _flush_goals(self):
+        """
+        Goals changed in the app are newer than any file and are kept; goals
+        still at the defaults a first login created are replaced.
+        """
+        if not self.dry_run:
+            res = self.client.table("macro_goals").select(",".join(MACROS)).eq("user_id", self.user_id).execute()
+            current = (res.data or [None])[0]
+            if current and any(float(current[m] or 0) != DEFAULT_GOALS[m] for m in MACROS):
+                self._count("macro_goals", "skipped")
+                return
+        self._flush("macro_goals", [self.goals], "user_id", ignore_duplicates=False)
+
+    def import_logs(self, path: str):
+        source = os.path.relpath(path, self.root)
+        size   = os.path.getsize(path)
+        start  = self.checkpoint.start(self.user_id, source, size)
+        batch, line = [], start
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            for raw in reader:
+                line = reader.line_num
+                if line <= start:
+                    self._count("food_logs", "skipped")
+                    continue
+                try:
+                    batch.append(log_row(self.user_id, source, line, raw))
+                except (ValueError, TypeError) as e:
+                    log.warning("%s:%s skipped: %s", source, line, e)
+                    self._count("food_logs", "invalid")
+                if len(batch) >= self.batch:
+                    self._flush("food_logs", batch, "log_id")
+                    self.checkpoint.advance(self.user_id, source, line, size)
+                    batch = []
+        self._flush("food_logs", batch, "log_id")
+        if not self.dry_run:
+            self.checkpoint.advance(self.user_id, source, line, size)
+
+    def import_goals(self, path: str):
+        with open(path, encoding="utf-8") as f:
+            raw = json.load(f)
+        try:
+            row = goals_row(self.user_id, raw)
+        except (KeyError, ValueError, TypeError) as e:
+            log.warning("%s skipped: %s", path, e)
+            self._count("macro_goals", "invalid")
+            return
+        # several goal files may apply; the last one listed wins
+        self.goals = row
+
+    def import_recipes(self, path: str):
+        with open(path, encoding="utf-8") as f:
+            raw = json.load(f)
+        existing = set()
+        if not self.dry_run:
+            res = self.client.table("recipes").select("recipe_name").eq("user_id", self.user_id).execute()
+            existing = {r["recipe_name"] for r in res.data or []}
+        rows = []
+        for name, recipe in raw.items():
+            if name in existing:
+                # created in the app already; the app's copy is kept
+                self._count("recipes", "skipped")
+                continue
+            try:
+                rows.append(recipe_row(self.user_id, name, recipe))
+            except (ValueError, TypeError, AttributeError) as e:
+                log.warning("%s: recipe %r skipped: %s", path, name, e)
+                self._count("recipes", "invalid")
+        self._flush("recipes", rows, "recipe_id")
+
+    def run(self, paths: list) -> dict:
+        self.goals = None
+        for path in paths:
+            log.info("importing %s", path)
+            {"food_logs": self.import_logs,
+             "macro_goals": self.import_goals,
+             "recipes": self.import_recipes}[kind(path)](path)
+        if self.goals is not None:
+            self._flush_goals()
+        return self.stats
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Import legacy macro-tracker CSV/JSON files into Supabase.")
+    parser.add_argument("paths", nargs="*", help="files to import (default: every legacy file for --user)")
+    parser.add_argument("--user", required=True, help="username the data belongs to; created if missing")
+    parser.add_argument("--root", default=ROOT, help="repository root holding data/ and config/")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="rows per upsert")
+    parser.add_argument("--state", default=os.path.join(ROOT, ".import_state.json"),
+                        help="checkpoint file for resuming (default: %(default)s)")
+    parser.add_argument("--dry-run", action="store_true", help="validate and count rows without writing")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    paths = [os.path.abspath(p) for p in args.paths] or discover(args.root, args.user)
+    if not paths:
+        log.error("no legacy files found under %s", args.root)
+        return 1
+    if args.dry_run:
+        client, user_id = None, str(uuid.uuid5(NAMESPACE, args.user))
+    else:
+        from db import supabase as client
+        from data import resolve_user
+        user_id = resolve_user(args.user)
+    importer = Importer(
+        client, user_id, root=args.root, batch=args.batch,
+        checkpoint=Checkpoint(None if args.dry_run else args.state), dry_run=args.dry_run,
+    )
+    stats = importer.run(paths)
+    print(json.dumps({"user_id": user_id, **stats}, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,233 @@
+import bisect
+import difflib
+import functools
+import heapq
+import math
+from datetime import date, datetime
+
+MACROS = ["calories", "protein", "carbs", "fat"]
+
+# a new user's goals; sql/bootstrap_user.sql and sql/login_user.sql insert the same values
+DEFAULT_GOALS = {"calories": 2000, "protein": 150, "carbs": 250, "fat": 70}
+
+# ______ Log times ______
+# The app writes times as "1:00 PM"; older and imported rows carry "13:00:00".
+TIME_FORMATS = ("%I:%M %p", "%H:%M:%S", "%H:%M")
+
+@functools.lru_cache(maxsize=4096)
+def time_key(value) -> str:
+    """A log time as sortable "HH:MM:SS" whichever way it was written; "" if unparseable."""
+    text = str(value or "").strip()
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).strftime("%H:%M:%S")
+        except ValueError:
+            pass
+    return ""
+
+# ______ Per-day totals index ______
+class DayIndex:
+    """
+    iso date → running macro totals and the log_ids logged that day.
+    Kept in step with the log history by add/remove, so reading a day's
+    totals never rescans the history.
+    """
+
+    # approximate memory per day and per row (tracemalloc, CPython 3.11)
+    DAY_BYTES = 270
+    ROW_BYTES = 85
+
+    def __init__(self, rows=()):
+        self._totals = {}   # day → [calories, protein, carbs, fat]
+        self._ids    = {}   # day → {log_id}
+        self._rows   = 0
+        for row in rows:
+            self.add(row)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._totals) * self.DAY_BYTES + self._rows * self.ROW_BYTES
+
+    def add(self, row: dict):
+        day = str(row["date"])
+        totals = self._totals.setdefault(day, [0.0] * len(MACROS))
+        for i, m in enumerate(MACROS):
+            totals[i] += float(row.get(m) or 0)
+        ids = self._ids.setdefault(day, set())
+        if row["log_id"] not in ids:
+            ids.add(row["log_id"])
+            self._rows += 1
+
+    def remove(self, row: dict):
+        day = str(row["date"])
+        ids = self._ids.get(day)
+        if not ids or row["log_id"] not in ids:
+            return
+        ids.discard(row["log_id"])
+        self._rows -= 1
+        if not ids:
+            # last entry gone: drop the day rather than keep float residue
+            del self._ids[day], self._totals[day]
+            return
+        totals = self._totals[day]
+        for i, m in enumerate(MACROS):
+            totals[i] -= float(row.get(m) or 0)
+
+    def totals(self, day: str) -> dict:
+        return dict(zip(MACROS, self._totals.get(day, [0.0] * len(MACROS))))
+
+    def log_ids(self, day: str) -> set:
+        return set(self._ids.get(day, ()))
+
+    def days_since(self, start: str) -> dict:
+        return {day: self.totals(day) for day in self._totals if day >= start}
+
+# ______ Food name search ______
+# Shared by FoodIndex and nutrition.NutritionDB: names are matched by prefix
+# with binary search over their sorted keys, and word by word through a
+# word → {name} map with its words kept sorted.
+def normalize_food(name) -> str:
+    return " ".join(str(name or "").split()).casefold()
+
+def prefixed(sorted_keys: list, prefix: str):
+    """The keys starting with `prefix`, in order."""
+    i = bisect.bisect_left(sorted_keys, prefix)
+    while i < len(sorted_keys) and sorted_keys[i].startswith(prefix):
+        yield sorted_keys[i]
+        i += 1
+
+def word_matches(tokens: dict, sorted_words: list, query: str) -> set:
+    """The names for which every query word prefixes some word of the name, in any order."""
+    by_word = [set().union(*(tokens[w] for w in prefixed(sorted_words, word))) for word in query.split()]
+    return set.intersection(*by_word) if by_word else set()
+
+class FoodIndex:
+    """
+    Every distinct food a user has logged, kept in step with the log history
+    by add/remove.  Lookups match name prefixes and word prefixes with binary
+    search over sorted keys, and rank by how often and how recently each food
+    was logged.  Each food remembers its most recent row so its macros can be
+    filled in.
+    """
+
+    HALF_LIFE_DAYS = 30
+    MIN_QUERY      = 2      # characters needed before a query is matched
+
+    # approximate memory per distinct food (with its words) and per row
+    FOOD_BYTES = 750
+    ROW_BYTES  = 27
+
+    def __init__(self, rows=()):
+        self._foods  = {}   # key → {log_id: row}
+        self._latest = {}   # key → most recent row
+        self._keys   = []   # sorted food keys
+        self._tokens = {}   # word → {key}
+        self._words  = []   # sorted words of every key
+        self._score  = {}   # key → rank score, see _rank_score
+        self._ranked = []   # sorted (score, key), best last
+        self._rows   = 0
+        for row in rows:
+            self.add(row)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._foods) * self.FOOD_BYTES + self._rows * self.ROW_BYTES
+
+    @staticmethod
+    def _stamp(row) -> str:
+        return f"{row.get('date') or ''} {time_key(row.get('time'))}"
+
+    def _rank_score(self, key: str) -> float:
+        """
+        log2 of count · 0.5^(age / HALF_LIFE_DAYS), less the part that only
+        depends on today: every food decays by the same factor each day, so
+        the order never changes until a food is logged or removed.
+        """
+        try:
+            day = date.fromisoformat(str(self._latest[key].get("date"))).toordinal()
+        except ValueError:
+            day = 0
+        return math.log2(len(self._foods[key])) + day / self.HALF_LIFE_DAYS
+
+    def _rerank(self, key: str):
+        old = self._score.pop(key, None)
+        if old is not None:
+            self._ranked.pop(bisect.bisect_left(self._ranked, (old, key)))
+        if key in self._foods:
+            score = self._score[key] = self._rank_score(key)
+            bisect.insort(self._ranked, (score, key))
+
+    def add(self, row: dict):
+        key = normalize_food(row.get("food"))
+        if not key:
+            return
+        entries = self._foods.get(key)
+        if entries is None:
+            entries = self._foods[key] = {}
+            bisect.insort(self._keys, key)
+            for word in set(key.split()):
+                if word not in self._tokens:
+                    self._tokens[word] = set()
+                    bisect.insort(self._words, word)
+                self._tokens[word].add(key)
+        if row["log_id"] not in entries:
+            self._rows += 1
+        entries[row["log_id"]] = row
+        latest = self._latest.get(key)
+        if latest is None or latest["log_id"] == row["log_id"] or self._stamp(row) >= self._stamp(latest):
+            self._latest[key] = row
+        self._rerank(key)
+
+    def remove(self, row: dict):
+        key = normalize_food(row.get("food"))
+        entries = self._foods.get(key)
+        if not entries or entries.pop(row["log_id"], None) is None:
+            return
+        self._rows -= 1
+        if entries:
+            if self._latest[key]["log_id"] == row["log_id"]:
+                self._latest[key] = max(entries.values(), key=self._stamp)
+            self._rerank(key)
+            return
+        del self._foods[key], self._latest[key]
+        self._rerank(key)
+        self._keys.pop(bisect.bisect_left(self._keys, key))
+        for word in set(key.split()):
+            self._tokens[word].discard(key)
+            if not self._tokens[word]:
+                del self._tokens[word]
+                self._words.pop(bisect.bisect_left(self._words, word))
+
+    def _candidates(self, query: str) -> set:
+        return set(prefixed(self._keys, query)) | word_matches(self._tokens, self._words, query)
+
+    def _suggestion(self, key: str) -> dict:
+        latest = self._latest[key]
+        return {
+            "food":        latest["food"],
+            "count":       len(self._foods[key]),
+            "last_logged": str(latest.get("date")),
+            **{m: float(latest.get(m) or 0) for m in MACROS},
+        }
+
+    def suggest(self, query: str, limit: int = 8) -> list:
+        """
+        Best matches for `query` as [{food, count, last_logged, calories, protein, carbs, fat}].
+        Queries shorter than MIN_QUERY get the user's top foods overall.
+        """
+        query = normalize_food(query)
+        if len(query) < self.MIN_QUERY:
+            return [self._suggestion(key) for _, key in reversed(self._ranked[-limit:])]
+
+        keys = self._candidates(query)
+        if not keys:
+            # typo fallback: each query word may match a close spelling of a
+            # word with the same first letter
+            close = [
+                set().union(*(self._tokens[w] for w in difflib.get_close_matches(
+                    word, list(prefixed(self._words, word[0])), n=3, cutoff=0.7)))
+                for word in query.split()
+            ]
+            keys = set.intersection(*close) if close else set()
+        best = heapq.nlargest(limit, keys, key=lambda key: (self._score[key], key))
+        return [self._suggestion(key) for key in best]
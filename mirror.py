@@ -0,0 +1,356 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+import httpx
+import streamlit as st
+from db import setting, iter_pages, is_transient, CircuitOpen
+
+log = logging.getLogger(__name__)
+
+# Primary key of every mirrored table
+PRIMARY_KEYS = {
+    "users":       "id",
+    "macro_goals": "user_id",
+    "recipes":     "recipe_id",
+    "food_logs":   "log_id",
+}
+
+# Failed pushes of one outbox item, after the server answered, before it is
+# set aside in dead_letters.  Failures to reach Supabase at all never count.
+MAX_PUSH_ATTEMPTS = 5
+UNREACHABLE       = (httpx.TransportError, CircuitOpen)
+
+# Keyset order each table is pulled in (see db.iter_pages)
+PULL_ORDER = {
+    "macro_goals": ("user_id",),
+    "recipes":     ("recipe_id",),
+    "food_logs":   ("date", "log_id"),
+}
+
+SCHEMA = """
+create table if not exists rows (
+    tbl     text not null,
+    pk      text not null,
+    user_id text,
+    day     text,                   -- food_logs.date, for watermark reads
+    data    text not null,          -- the row as JSON
+    primary key (tbl, pk)
+);
+create index if not exists rows_user on rows (tbl, user_id, day);
+
+create table if not exists outbox (
+    seq        integer primary key autoincrement,
+    tbl        text not null,
+    op         text not null,       -- 'upsert' | 'delete'
+    payload    text not null,       -- JSON list of rows (upsert) or of keys (delete)
+    attempts   integer not null default 0,
+    last_error text
+);
+
+create table if not exists dead_letters (
+    seq        integer primary key,  -- the outbox seq it had
+    tbl        text not null,
+    op         text not null,
+    payload    text not null,
+    attempts   integer not null,
+    last_error text,
+    failed_at  real not null
+);
+
+create table if not exists sync_state (
+    user_id   text not null,
+    tbl       text not null,
+    watermark text,
+    pulled_at real,
+    primary key (user_id, tbl)
+);
+"""
+
+class LocalMirror:
+    """
+    Local SQLite copy of users, macro_goals, recipes and food_logs.
+
+    Reads and writes are served from the local file.  Writes are also queued
+    in `outbox`, which a SyncWorker pushes to Supabase in order; the worker
+    then pulls remote changes back.  A write the server rejects is moved to
+    `dead_letters` so it cannot hold up the ones behind it; the next pull
+    then replaces its local copy with the server's.  `client` is anything
+    with the supabase `table(...)...execute()` interface, so a local
+    PostgREST stand-in (bench/fake_supabase.py) can be passed in place of
+    the real client.
+    """
+
+    def __init__(self, path: str, client):
+        self.client = client
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("pragma journal_mode=wal")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.RLock()
+        self._track_lock = threading.Lock()
+        self._tracked = set()
+        self.worker = None      # the SyncWorker, woken after every local write
+
+    # ______ Local reads ______
+    def select(self, table: str, user_id: str, since: str = None) -> list:
+        sql, args = "select data from rows where tbl = ? and user_id = ?", [table, user_id]
+        if since is not None:
+            sql += " and day >= ?"
+            args.append(since)
+        with self._lock:
+            return [json.loads(data) for (data,) in self._conn.execute(sql, args)]
+
+    def find_user(self, username: str):
+        with self._lock:
+            for (data,) in self._conn.execute("select data from rows where tbl = 'users'"):
+                row = json.loads(data)
+                if row.get("username") == username:
+                    return row
+        return None
+
+    # ______ Local writes ______
+    def store(self, table: str, rows: list):
+        """Keep rows that already exist remotely; nothing is queued."""
+        with self._lock, self._conn:
+            self._store(table, rows)
+
+    def _store(self, table: str, rows: list):
+        pk = PRIMARY_KEYS[table]
+        self._conn.executemany(
+            "insert into rows (tbl, pk, user_id, day, data) values (?, ?, ?, ?, ?) "
+            "on conflict (tbl, pk) do update set user_id = excluded.user_id, day = excluded.day, data = excluded.data",
+            [(table, str(r[pk]), r.get("user_id", r.get("id")), r.get("date"), json.dumps(r, default=str)) for r in rows],
+        )
+
+    def upsert(self, table: str, rows: list) -> list:
+        """Store rows locally (merged over any existing copy) and queue them for push."""
+        pk = PRIMARY_KEYS[table]
+        saved = []
+        with self._lock, self._conn:
+            for row in rows:
+                row = dict(row)
+                if row.get(pk) is None:
+                    row[pk] = str(uuid.uuid4())
+                current = self._conn.execute(
+                    "select data from rows where tbl = ? and pk = ?", (table, str(row[pk]))
+                ).fetchone()
+                saved.append({**(json.loads(current[0]) if current else {}), **row})
+            self._store(table, saved)
+            self._conn.execute(
+                "insert into outbox (tbl, op, payload) values (?, 'upsert', ?)",
+                (table, json.dumps(saved, default=str)),
+            )
+        self._wake()
+        return saved
+
+    def delete(self, table: str, ids: list):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "delete from rows where tbl = ? and pk = ?", [(table, str(i)) for i in ids]
+            )
+            self._conn.execute(
+                "insert into outbox (tbl, op, payload) values (?, 'delete', ?)",
+                (table, json.dumps([str(i) for i in ids])),
+            )
+        self._wake()
+
+    def _wake(self):
+        # push now rather than at the end of the worker's interval
+        if self.worker is not None:
+            self.worker.wake.set()
+
+    # ______ Sync ______
+    def track(self, user_id: str):
+        """Pull a user's data once if it has never been mirrored, then keep it in the sync loop."""
+        if user_id in self._tracked:
+            return
+        # the post-login loaders call this side by side: the rest wait for the
+        # first pull instead of reading a half-pulled user
+        with self._track_lock:
+            if user_id in self._tracked:
+                return
+            with self._lock:
+                # food_logs is pulled last, so its state marks a complete pull
+                seen = self._conn.execute(
+                    "select 1 from sync_state where user_id = ? and tbl = 'food_logs'", (user_id,)
+                ).fetchone()
+            if not seen:
+                self.pull(user_id)
+            self._tracked.add(user_id)
+
+    def pending(self) -> int:
+        with self._lock:
+            return self._conn.execute("select count(*) from outbox").fetchone()[0]
+
+    def dead_letters(self) -> list:
+        """Writes the server rejected, oldest first, as {seq, tbl, op, payload, attempts, last_error, failed_at}."""
+        with self._lock:
+            cur = self._conn.execute("select * from dead_letters order by seq")
+            columns = [c[0] for c in cur.description]
+            return [dict(zip(columns, row)) for row in cur]
+
+    def stats(self) -> dict:
+        with self._lock:
+            dead = self._conn.execute("select count(*) from dead_letters").fetchone()[0]
+        return {"pending": self.pending(), "dead_letters": dead}
+
+    @staticmethod
+    def _rejected(e: Exception, attempts: int) -> bool:
+        """Whether a failed outbox item is set aside rather than retried."""
+        if isinstance(e, UNREACHABLE):
+            return False    # the write waits, however long Supabase is away
+        return not is_transient(e) or attempts >= MAX_PUSH_ATTEMPTS
+
+    def push(self) -> int:
+        """
+        Send queued writes in order.  Stops at the first failure that may
+        pass on a retry, so order is preserved; rejected writes are moved to
+        dead_letters and the rest carry on.
+        """
+        sent = 0
+        while True:
+            with self._lock:
+                item = self._conn.execute(
+                    "select seq, tbl, op, payload, attempts from outbox order by seq limit 1"
+                ).fetchone()
+            if item is None:
+                return sent
+            seq, table, op, payload, attempts = item
+            pk = PRIMARY_KEYS[table]
+            try:
+                if op == "upsert":
+                    self.client.table(table).upsert(json.loads(payload), on_conflict=pk).execute()
+                else:
+                    self.client.table(table).delete().in_(pk, json.loads(payload)).execute()
+            except Exception as e:
+                if not isinstance(e, UNREACHABLE):
+                    attempts += 1
+                with self._lock, self._conn:
+                    self._conn.execute(
+                        "update outbox set attempts = ?, last_error = ? where seq = ?",
+                        (attempts, str(e), seq),
+                    )
+                    if self._rejected(e, attempts):
+                        self._conn.execute(
+                            "insert into dead_letters (seq, tbl, op, payload, attempts, last_error, failed_at) "
+                            "select seq, tbl, op, payload, attempts, last_error, ? from outbox where seq = ?",
+                            (time.time(), seq),
+                        )
+                        self._conn.execute("delete from outbox where seq = ?", (seq,))
+                        log.error("mirror push of outbox #%s rejected, moved to dead_letters: %s", seq, e)
+                        continue
+                log.warning("mirror push of outbox #%s failed: %s", seq, e)
+                return sent
+            with self._lock, self._conn:
+                self._conn.execute("delete from outbox where seq = ?", (seq,))
+            sent += 1
+
+    def _pending_keys(self, table: str) -> set:
+        keys = set()
+        for op, payload in self._conn.execute("select op, payload from outbox where tbl = ?", (table,)):
+            items = json.loads(payload)
+            keys.update(items if op == "delete" else (str(r[PRIMARY_KEYS[table]]) for r in items))
+        return keys
+
+    def pull(self, user_id: str) -> list:
+        """
+        Bring the user's remote rows into the mirror; returns the tables that changed.
+        Rows with writes still waiting in the outbox keep their local version
+        (local wins until pushed); otherwise the remote copy wins, and local
+        rows missing remotely are removed.  food_logs is pulled from the
+        per-user date watermark, like data.sync_logs.
+        """
+        changed = []
+        for table in ("macro_goals", "recipes", "food_logs"):
+            pk = PRIMARY_KEYS[table]
+            with self._lock:
+                state = self._conn.execute(
+                    "select watermark from sync_state where user_id = ? and tbl = ?", (user_id, table)
+                ).fetchone()
+            watermark = state[0] if state and table == "food_logs" else None
+
+            # every page has to be in before anything is marked gone or the watermark moves
+            remote = [
+                row
+                for page in iter_pages(table, user_id, columns="*", order=PULL_ORDER[table],
+                                       start=watermark, client=self.client)
+                for row in page
+            ]
+
+            with self._lock, self._conn:
+                pending = self._pending_keys(table)
+                local_sql = "select pk, data from rows where tbl = ? and user_id = ?"
+                args = [table, user_id]
+                if watermark is not None:
+                    local_sql += " and day >= ?"
+                    args.append(watermark)
+                local = {k: d for k, d in self._conn.execute(local_sql, args)}
+
+                fresh = [r for r in remote if str(r[pk]) not in pending]
+                gone  = set(local) - {str(r[pk]) for r in remote} - pending
+                if any(local.get(str(r[pk])) != json.dumps(r, default=str) for r in fresh) or gone:
+                    changed.append(table)
+                self._store(table, fresh)
+                self._conn.executemany(
+                    "delete from rows where tbl = ? and pk = ?", [(table, k) for k in gone]
+                )
+
+                days = [str(r["date"]) for r in remote if r.get("date")]
+                new_watermark = max(days + ([watermark] if watermark else [])) if days else watermark
+                self._conn.execute(
+                    "insert into sync_state (user_id, tbl, watermark, pulled_at) values (?, ?, ?, ?) "
+                    "on conflict (user_id, tbl) do update set watermark = excluded.watermark, pulled_at = excluded.pulled_at",
+                    (user_id, table, new_watermark, time.time()),
+                )
+        return changed
+
+    def sync_once(self, on_change=None):
+        self.push()
+        for user_id in list(self._tracked):
+            try:
+                changed = self.pull(user_id)
+            except Exception as e:
+                log.warning("mirror pull for %s failed: %s", user_id, e)
+                continue
+            if changed and on_change:
+                on_change(user_id, changed)
+
+class SyncWorker(threading.Thread):
+    """Background thread that pushes the outbox and pulls remote changes every `interval` seconds."""
+
+    def __init__(self, mirror: LocalMirror, interval: float = 30, on_change=None):
+        super().__init__(name="mirror-sync", daemon=True)
+        self.mirror = mirror
+        self.interval = interval
+        self.on_change = on_change
+        self.wake = threading.Event()
+
+    def run(self):
+        while True:
+            try:
+                self.mirror.sync_once(self.on_change)
+            except Exception as e:
+                log.warning("mirror sync failed: %s", e)
+            self.wake.wait(self.interval)
+            self.wake.clear()
+
+@st.cache_resource
+def get_mirror(_client, _on_change=None):
+    """
+    The process-wide mirror, or None when MACRO_TRACKER_MIRROR (a SQLite file
+    path, from the environment or st.secrets) is not set.
+    """
+    path = setting("MACRO_TRACKER_MIRROR")
+    if not path:
+        return None
+    mirror = LocalMirror(path, _client)
+    worker = SyncWorker(
+        mirror,
+        interval=float(setting("MACRO_TRACKER_SYNC_INTERVAL") or 30),
+        on_change=_on_change,
+    )
+    worker.start()
+    mirror.worker = worker
+    return mirror
@@ -0,0 +1,71 @@
+import csv
+import os
+import numpy as np
+import streamlit as st
+from logstore import MACROS, normalize_food, prefixed, word_matches
+
+NUTRITION_PATH = os.path.join(os.path.dirname(__file__), "data", "nutrition", "foods.csv")
+
+# ______ Bundled nutrition table ______
+# A small read-only table of common foods with per-serving macros (rounded
+# from USDA FoodData Central reference values).  It is loaded once per server
+# process into column arrays: names and servings as tuples, macros as one
+# float32 matrix, so every session shares a single compact copy.
+class NutritionDB:
+    """
+    Common foods with per-serving macros, searched by name and word prefix
+    (logstore.prefixed and logstore.word_matches).
+    """
+
+    def __init__(self, names, servings, macros):
+        self.names    = tuple(names)
+        self.servings = tuple(servings)
+        self.macros   = np.asarray(macros, dtype=np.float32).reshape(len(self.names), len(MACROS))
+        self.macros.flags.writeable = False
+
+        self._rows = {}     # key → [row]
+        for i, name in enumerate(self.names):
+            self._rows.setdefault(normalize_food(name.replace(",", " ")), []).append(i)
+        self._keys   = sorted(self._rows)
+        self._tokens = {}   # word → {key}
+        for key in self._keys:
+            for word in set(key.split()):
+                self._tokens.setdefault(word, set()).add(key)
+        self._words  = sorted(self._tokens)
+
+    @classmethod
+    def from_csv(cls, path: str = NUTRITION_PATH) -> "NutritionDB":
+        names, servings, macros = [], [], []
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                names.append(row["name"])
+                servings.append(row["serving"])
+                macros.append([float(row[m] or 0) for m in MACROS])
+        return cls(names, servings, macros)
+
+    def __len__(self):
+        return len(self.names)
+
+    def row(self, i: int) -> dict:
+        return {
+            "food":    self.names[i],
+            "serving": self.servings[i],
+            **{m: round(float(v), 1) for m, v in zip(MACROS, self.macros[i])},
+        }
+
+    def _matches(self, query: str) -> list:
+        # names starting with the query first, then word matches, shortest name first
+        found = [i for key in prefixed(self._keys, query) for i in self._rows[key]]
+        by_word = {i for key in word_matches(self._tokens, self._words, query) for i in self._rows[key]}
+        return found + sorted(by_word - set(found), key=lambda i: len(self.names[i]))
+
+    def lookup(self, query: str, limit: int = 8) -> list:
+        """Best matches for `query` as [{food, serving, calories, protein, carbs, fat}]."""
+        query = normalize_food(str(query or "").replace(",", " "))
+        if not query:
+            return []
+        return [self.row(i) for i in self._matches(query)[:limit]]
+
+@st.cache_resource
+def get_nutrition_db() -> NutritionDB:
+    return NutritionDB.from_csv()
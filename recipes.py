@@ -0,0 +1,25 @@
+def normalize_name(name) -> str:
+    """Case- and whitespace-insensitive lookup key for a recipe name."""
+    return " ".join(str(name).split()).casefold()
+
+class RecipeIndex:
+    """
+    One user's recipes, indexed by recipe_id and normalized name, with the
+    display names pre-sorted for selectboxes.  Built once per version of the
+    cached recipe list (`source`) and shared by every tab.
+    """
+
+    def __init__(self, records: list):
+        self.source  = records
+        self.by_id   = {r["recipe_id"]: r for r in records}
+        self.by_name = {normalize_name(r["recipe_name"]): r for r in records}
+        self.names   = sorted((r["recipe_name"] for r in records), key=normalize_name)
+
+    def get(self, name):
+        return self.by_name.get(normalize_name(name))
+
+    def __contains__(self, name) -> bool:
+        return normalize_name(name) in self.by_name
+
+    def __len__(self) -> int:
+        return len(self.by_id)
@@ -0,0 +1,51 @@
+import json
+import logging
+import os
+import threading
+import streamlit as st
+from db import setting
+
+log = logging.getLogger(__name__)
+
+ASSET_PATH     = os.path.join(os.path.dirname(__file__), "assets", "welcome.json")
+REMOTE_TIMEOUT = 3  # seconds
+
+# ______ Welcome animation ______
+# The splash animation ships with the app and is read once per process.  A
+# remote animation can be configured with MACRO_TRACKER_LOTTIE_URL; it is
+# fetched once on a background thread, and the bundled one is shown until
+# (and unless) that fetch succeeds, so the login form never waits on a CDN.
+@st.cache_resource
+def bundled_animation() -> dict:
+    with open(ASSET_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+class RemoteAnimation(threading.Thread):
+    def __init__(self, url: str, timeout: float = REMOTE_TIMEOUT):
+        super().__init__(name="lottie-fetch", daemon=True)
+        self.url = url
+        self.timeout = timeout
+        self.value = None
+
+    def run(self):
+        import requests
+        try:
+            r = requests.get(self.url, timeout=self.timeout)
+            r.raise_for_status()
+            self.value = r.json()
+        except Exception as e:
+            log.warning("remote welcome animation unavailable (%s): %s", self.url, e)
+
+@st.cache_resource
+def _remote_animation(url: str) -> RemoteAnimation:
+    fetch = RemoteAnimation(url)
+    fetch.start()
+    return fetch
+
+def welcome_animation() -> dict:
+    url = setting("MACRO_TRACKER_LOTTIE_URL")
+    if url:
+        remote = _remote_animation(url).value
+        if remote:
+            return remote
+    return bundled_animation()
@@ -0,0 +1,23 @@
+-- Post-login bootstrap used by data.bootstrap().
+-- Returns a user's macro goals, recipes and food logs in one round trip and
+-- creates default goals for new users in the same call.  p_since is the
+-- caller's log sync watermark: only logs dated on or after it are returned.
+create or replace function public.bootstrap_user(p_user_id uuid, p_since date default null)
+returns jsonb
+language plpgsql
+as $$
+begin
+  insert into public.macro_goals (user_id, calories, protein, carbs, fat)
+  values (p_user_id, 2000, 150, 250, 70)
+  on conflict (user_id) do nothing;
+
+  return jsonb_build_object(
+    'goals',   (select to_jsonb(g) from public.macro_goals g where g.user_id = p_user_id),
+    'recipes', coalesce((select jsonb_agg(to_jsonb(r)) from public.recipes r
+                         where r.user_id = p_user_id), '[]'::jsonb),
+    'logs',    coalesce((select jsonb_agg(to_jsonb(l)) from public.food_logs l
+                         where l.user_id = p_user_id
+                           and (p_since is null or l.date >= p_since)), '[]'::jsonb)
+  );
+end;
+$$;
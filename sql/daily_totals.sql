@@ -0,0 +1,18 @@
+-- Per-user daily macro totals read by data.fetch_daily_totals().
+-- The dashboard's weekly summary reads at most seven of these rows instead of
+-- aggregating raw food_logs on the client.
+create index if not exists food_logs_user_id_date_idx
+  on public.food_logs (user_id, date);
+
+create or replace view public.daily_totals
+with (security_invoker = true) as
+select
+  user_id,
+  date,
+  sum(calories) as calories,
+  sum(protein)  as protein,
+  sum(carbs)    as carbs,
+  sum(fat)      as fat,
+  count(*)      as entries
+from public.food_logs
+group by user_id, date;
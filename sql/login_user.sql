@@ -0,0 +1,28 @@
+-- Login used by data.resolve_user().
+-- Returns the id of the user called p_username, creating the user (with
+-- p_user_id) and their default macro goals first if they do not exist yet,
+-- all in one round trip.  Concurrent first logins are safe: the unique
+-- username index makes the losing insert a no-op and both calls return the
+-- winner's id.
+create unique index if not exists users_username_key on public.users (username);
+
+create or replace function public.login_user(p_username text, p_user_id uuid)
+returns uuid
+language plpgsql
+as $$
+declare
+  v_id uuid;
+begin
+  insert into public.users (id, username)
+  values (p_user_id, p_username)
+  on conflict (username) do nothing;
+
+  select id into v_id from public.users where username = p_username;
+
+  insert into public.macro_goals (user_id, calories, protein, carbs, fat)
+  values (v_id, 2000, 150, 250, 70)
+  on conflict (user_id) do nothing;
+
+  return v_id;
+end;
+$$;
@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+# db.py builds the real client at import time; it never connects in these tests
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test")
+
+import streamlit as st
+import db
+import data
+from fake_supabase import FakeSupabase, seed_user
+
+@pytest.fixture
+def fake(monkeypatch):
+    """A FakeSupabase installed as the app's client, with every process-wide cache empty."""
+    monkeypatch.delenv("MACRO_TRACKER_MIRROR", raising=False)
+    fake = FakeSupabase(rollup=True)
+    monkeypatch.setattr(db, "supabase", fake)
+    monkeypatch.setattr(data, "supabase", fake)
+    st.cache_resource.clear()
+    for flag in (data._rollup_missing, data._rpc_missing, data._login_rpc_missing):
+        flag.clear()
+    yield fake
+    st.cache_resource.clear()
+
+@pytest.fixture
+def user(fake):
+    return seed_user(fake, "ana", 200, per_day=8, seed=1)
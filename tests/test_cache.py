@@ -0,0 +1,72 @@
+import data
+from cache import UserCache
+
+def test_eviction_drops_the_log_history(fake, monkeypatch):
+    from fake_supabase import seed_user
+    monkeypatch.setenv("MACRO_TRACKER_CACHE_MB", "0.25")
+    first  = seed_user(fake, "ana", 1000, seed=1)
+    second = seed_user(fake, "ben", 1000, seed=2)
+
+    assert len(data.fetch_logs(first)) == 1000
+    assert first in data._log_history()
+    assert len(data.fetch_logs(second)) == 1000
+
+    cache = data._user_cache()
+    assert cache.stats()["evictions"] > 0
+    assert cache.peek(first, "food_logs") is data.MISSING
+    assert first not in data._log_history()
+    assert second in data._log_history()
+
+    # the next read reloads the whole history, not just a delta from the old watermark
+    assert len(data.fetch_logs(first)) == 1000
+    assert data.day_totals(first, data._log_history()[first]["watermark"])["entries"] == 8
+
+def test_history_is_charged_to_the_food_logs_entry(fake):
+    from fake_supabase import seed_user
+    user = seed_user(fake, "ana", 500, seed=1)
+    rows = data.fetch_logs(user)
+    cache = data._user_cache()
+    assert cache.stats()["bytes"] >= data.approx_size(rows) + data._history_bytes(user)
+
+def test_other_cache_instances_leave_the_history_alone(fake):
+    from fake_supabase import seed_user
+    user = seed_user(fake, "ana", 200, seed=1)
+    data.fetch_logs(user)
+
+    other = UserCache(max_bytes=1)
+    other.put(user, "food_logs", ["a" * 1000])
+    other.put("someone-else", "food_logs", ["b" * 1000])
+    assert other.stats()["evictions"] == 1
+    assert user in data._log_history()
+
+def test_reload_under_pressure_keeps_the_history(fake):
+    from datetime import date
+    from fake_supabase import seed_user
+    first  = seed_user(fake, "ana", 8, seed=1)
+    second = seed_user(fake, "ben", 8, seed=2)
+    today  = date.today().isoformat()
+    data.bootstrap(first, ("macro_goals", "food_logs"))
+    data.bootstrap(second, ("macro_goals", "food_logs"))
+
+    # ana's entries are expired and least recently used, in a cache that is all but full
+    cache = data._user_cache()
+    cache.max_bytes = cache.stats()["bytes"] - 1
+    for key, (stored_at, value, size) in list(cache._entries.items()):
+        cache._entries[key] = (stored_at - cache.ttl - 1, value, size)
+
+    loaded = data.bootstrap(first, ("macro_goals", "food_logs"))
+    assert len(loaded["logs"]) == 8
+    assert first in data._log_history()
+    assert data.day_totals(first, today)["entries"] == 8
+
+def test_index_readers_reload_an_evicted_history(fake):
+    from datetime import date
+    from fake_supabase import seed_user
+    user  = seed_user(fake, "ana", 8, seed=1)
+    today = date.today().isoformat()
+    data.fetch_logs(user)
+    data._forget_history(user)
+
+    assert data.day_totals(user, today)["entries"] == 8
+    assert len(data.day_entries(user, today)) == 8
+    assert data.suggest_foods(user, "")
@@ -0,0 +1,75 @@
+import httpx
+import pytest
+
+import db
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(db.time, "monotonic", lambda: now[0])
+    return now
+
+@pytest.fixture
+def breaker(clock, monkeypatch):
+    monkeypatch.setattr(db, "RETRY_BASE", 0)
+    return db.Resilience()
+
+def fail():
+    raise httpx.ConnectError("connection refused")
+
+def test_breaker_opens_trials_and_closes(breaker, clock):
+    for _ in range(db.BREAKER_THRESHOLD):
+        with pytest.raises(httpx.ConnectError):
+            breaker.call(fail, retry=False)
+    assert breaker.state() == "open"
+
+    # open: calls fail fast without reaching the server
+    calls = []
+    with pytest.raises(db.CircuitOpen):
+        breaker.call(lambda: calls.append(1), retry=False)
+    assert calls == [] and breaker.stats["short_circuited"] == 1
+
+    # half-open: one trial call is let through, and a failure reopens it
+    clock[0] += db.BREAKER_COOLDOWN
+    assert breaker.state() == "half-open"
+    with pytest.raises(httpx.ConnectError):
+        breaker.call(fail, retry=False)
+    assert breaker.state() == "open"
+
+    # a successful trial closes it
+    clock[0] += db.BREAKER_COOLDOWN
+    assert breaker.call(lambda: "ok", retry=False) == "ok"
+    assert breaker.state() == "closed" and breaker.failures == 0
+    assert breaker.stats["opened"] == 1
+
+def test_only_one_trial_while_half_open(breaker, clock):
+    for _ in range(db.BREAKER_THRESHOLD):
+        with pytest.raises(httpx.ConnectError):
+            breaker.call(fail, retry=False)
+    clock[0] += db.BREAKER_COOLDOWN
+
+    def concurrent():
+        # a second call arriving while the trial is in flight is refused
+        with pytest.raises(db.CircuitOpen):
+            breaker.call(lambda: None, retry=False)
+        return "ok"
+    assert breaker.call(concurrent, retry=False) == "ok"
+    assert breaker.state() == "closed"
+
+def test_retries_transient_errors_but_not_others(breaker):
+    attempts = []
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < db.READ_RETRIES:
+            fail()
+        return "ok"
+    assert breaker.call(flaky, retry=True) == "ok"
+    assert len(attempts) == db.READ_RETRIES and breaker.failures == 0
+
+    def rejected():
+        attempts.append(1)
+        raise db.APIError({"message": "duplicate key", "code": "23505"})
+    attempts.clear()
+    with pytest.raises(db.APIError):
+        breaker.call(rejected, retry=True)
+    assert len(attempts) == 1 and breaker.failures == 0
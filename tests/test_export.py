@@ -0,0 +1,20 @@
+import csv
+import io
+
+import pytest
+from streamlit.runtime.download_data_util import convert_data_to_bytes_and_infer_mime
+
+from export import export_bytes, available_formats
+
+def test_download_payload_is_a_type_streamlit_accepts(fake, user):
+    payload, _ = convert_data_to_bytes_and_infer_mime(export_bytes(user, "csv"), TypeError("unsupported"))
+    rows = list(csv.DictReader(io.StringIO(payload.decode("utf-8"))))
+    assert len(rows) == 200
+    assert len({r["log_id"] for r in rows}) == 200
+
+def test_parquet_download_has_every_row(fake, user):
+    if "parquet" not in available_formats():
+        pytest.skip("pyarrow is not installed")
+    import pyarrow.parquet as pq
+    payload, _ = convert_data_to_bytes_and_infer_mime(export_bytes(user, "parquet"), TypeError("unsupported"))
+    assert pq.read_table(io.BytesIO(payload)).num_rows == 200
@@ -0,0 +1,145 @@
+from datetime import date, timedelta
+
+import httpx
+import pytest
+
+import data
+import db
+from fake_supabase import _Query
+from logstore import MACROS
+
+TODAY     = date.today().isoformat()
+YESTERDAY = (date.today() - timedelta(days=1)).isoformat()
+WEEK_AGO  = (date.today() - timedelta(days=6)).isoformat()
+
+def remote_logs(fake, user_id: str) -> dict:
+    return {r["log_id"]: r for r in fake.rows("food_logs") if r["user_id"] == user_id}
+
+def remote_totals(fake, user_id: str, day: str) -> dict:
+    rows = [r for r in remote_logs(fake, user_id).values() if str(r["date"]) == day]
+    return {**{m: sum(float(r[m] or 0) for r in rows) for m in MACROS}, "entries": len(rows)}
+
+def assert_days_match(fake, user_id: str, start: str):
+    remote = {str(r["date"]) for r in remote_logs(fake, user_id).values() if str(r["date"]) >= start}
+    rollup = data.fetch_daily_totals(user_id, start)
+    for day in remote | set(rollup):
+        expected = remote_totals(fake, user_id, day)
+        assert data.day_totals(user_id, day) == pytest.approx(expected)
+        assert rollup.get(day, dict.fromkeys(MACROS, 0.0)) == pytest.approx(
+            {m: expected[m] for m in MACROS})
+
+def rollup_reads(fake) -> int:
+    return sum(1 for table, op in fake.calls if table == "daily_totals")
+
+# ______ Watermark sync ______
+def test_sync_replaces_the_tail_after_remote_edits_and_deletes(fake, user):
+    assert len(data.fetch_logs(user)) == 200
+
+    today = [r for r in fake.rows("food_logs") if r["user_id"] == user and r["date"] == TODAY]
+    edited, deleted = today[0], today[1]
+    edited["calories"] = 999.0
+    fake.tables["food_logs"] = [r for r in fake.rows("food_logs") if r is not deleted]
+    fake.rows("food_logs").append({**edited, "log_id": "added-elsewhere", "food": "Kiwi"})
+    fake.writes += 1
+
+    rows = {r["log_id"]: r for r in data.sync_logs(user)}
+    assert rows == remote_logs(fake, user)
+    assert rows[edited["log_id"]]["calories"] == 999.0
+    assert deleted["log_id"] not in rows
+    assert data.day_totals(user, TODAY) == pytest.approx(remote_totals(fake, user, TODAY))
+    assert deleted["log_id"] not in {r["log_id"] for r in data.day_entries(user, TODAY)}
+
+def test_sync_only_pulls_from_the_watermark(fake, user):
+    data.fetch_logs(user)
+    fake.calls.clear()
+    rows = data.sync_logs(user)
+    assert len(rows) == 200
+    assert fake.calls == [("food_logs", "select")]
+
+def test_full_resync_picks_up_changes_below_the_watermark(fake, user):
+    data.fetch_logs(user)
+    old = [r for r in fake.rows("food_logs") if r["user_id"] == user and r["date"] == WEEK_AGO]
+    edited, deleted = old[0], old[1]
+    edited["calories"] = 999.0
+    fake.tables["food_logs"] = [r for r in fake.rows("food_logs") if r is not deleted]
+    fake.rows("food_logs").append({**edited, "log_id": "imported", "food": "Quince"})
+    fake.writes += 1
+
+    # the delta only covers the watermark day onward
+    rows = {r["log_id"]: r for r in data.sync_logs(user)}
+    assert "imported" not in rows and deleted["log_id"] in rows
+
+    data._log_history()[user]["resynced"] -= data.FULL_RESYNC
+    rows = {r["log_id"]: r for r in data.sync_logs(user)}
+    assert rows == remote_logs(fake, user)
+    assert data.day_totals(user, WEEK_AGO) == pytest.approx(remote_totals(fake, user, WEEK_AGO))
+    assert [s["food"] for s in data.suggest_foods(user, "quin")] == ["Quince"]
+    assert data._log_history()[user]["watermark"] == TODAY
+
+# ______ Write-through ______
+def test_merge_and_drop_keep_day_index_and_daily_totals_consistent(fake, user):
+    data.fetch_logs(user)
+    assert_days_match(fake, user, WEEK_AGO)
+    reads = rollup_reads(fake)
+
+    data.log_foods(user, [{"date": TODAY, "time": "21:00:00", "food": "Kiwi",
+                           "calories": 42.0, "protein": 1.0, "carbs": 10.0, "fat": 0.5}])
+    assert_days_match(fake, user, WEEK_AGO)
+
+    moved = next(r for r in fake.rows("food_logs") if r["user_id"] == user and r["date"] == YESTERDAY)
+    data.update_row("food_logs", moved["log_id"], {"date": TODAY, "calories": 123.0})
+    assert_days_match(fake, user, WEEK_AGO)
+
+    gone = [r["log_id"] for r in fake.rows("food_logs") if r["user_id"] == user and r["date"] == YESTERDAY]
+    data.delete_rows("food_logs", user, gone)
+    assert_days_match(fake, user, WEEK_AGO)
+    assert data.day_totals(user, YESTERDAY)["entries"] == 0
+
+    # every check after the first was served from the patched cache window
+    assert rollup_reads(fake) == reads
+
+def test_log_foods_retry_does_not_duplicate_rows(fake, user, monkeypatch):
+    data.fetch_logs(user)
+    before = len(remote_logs(fake, user))
+
+    # the first bulk write lands, then its response is lost
+    execute, lost = _Query.execute, []
+    def flaky_execute(query):
+        res = execute(query)
+        if query.op == "upsert" and not lost:
+            lost.append(query)
+            raise httpx.ReadTimeout("response lost")
+        return res
+    monkeypatch.setattr(_Query, "execute", flaky_execute)
+    monkeypatch.setattr(db, "RETRY_BASE", 0)
+    monkeypatch.setattr(data, "supabase", db.ResilientClient(fake, db.Resilience()))
+
+    entries = [{"date": TODAY, "time": "22:00:00", "food": f"Snack {i}",
+                "calories": 100.0, "protein": 5.0, "carbs": 10.0, "fat": 3.0} for i in range(3)]
+    saved = data.log_foods(user, entries)
+
+    assert fake.calls.count(("food_logs", "upsert")) == 2
+    assert len(saved) == 3
+    logs = [r for r in fake.rows("food_logs") if r["user_id"] == user]
+    assert len(logs) == before + 3
+    assert len({r["log_id"] for r in logs}) == len(logs)
+    assert data.day_totals(user, TODAY) == pytest.approx(remote_totals(fake, user, TODAY))
+
+def test_day_entries_are_in_clock_order(fake, user):
+    data.fetch_logs(user)
+    for log_id, time in [("pm", "1:00 PM"), ("late", "8:30 PM"), ("am", "9:00 AM"), ("ten", "10:00 AM"),
+                         ("legacy", "12:15:00")]:
+        data.log_foods(user, [{"log_id": log_id, "date": "2030-01-01", "time": time, "food": "Tea",
+                               "calories": 0.0, "protein": 0.0, "carbs": 0.0, "fat": 0.0}])
+    assert [r["log_id"] for r in data.day_entries(user, "2030-01-01")] == ["am", "ten", "legacy", "pm", "late"]
+
+def test_suggestions_fill_in_the_latest_entry(fake, user):
+    data.fetch_logs(user)
+    for log_id, time, calories in [("noon", "1:00 PM", 300.0), ("morning", "9:00 AM", 100.0)]:
+        data.log_foods(user, [{"log_id": log_id, "date": "2030-01-01", "time": time, "food": "Porridge",
+                               "calories": calories, "protein": 0.0, "carbs": 0.0, "fat": 0.0}])
+    suggestion = data.suggest_foods(user, "porr")[0]
+    assert (suggestion["food"], suggestion["calories"]) == ("Porridge", 300.0)
+
+    data.delete_rows("food_logs", user, ["noon"])
+    assert data.suggest_foods(user, "porr")[0]["calories"] == 100.0
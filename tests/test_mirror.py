@@ -0,0 +1,132 @@
+import threading
+import time
+
+import httpx
+import pytest
+from postgrest.exceptions import APIError
+
+import mirror as mirror_module
+from fake_supabase import _Query
+from mirror import LocalMirror
+
+def remote(fake, log_id):
+    return next((r for r in fake.rows("food_logs") if r["log_id"] == log_id), None)
+
+def log_row(user_id, log_id, **macros):
+    return {"log_id": log_id, "user_id": user_id, "date": "2026-01-02", "time": "12:00:00",
+            "food": "Toast", "calories": 100.0, "protein": 4.0, "carbs": 18.0, "fat": 2.0, **macros}
+
+@pytest.fixture
+def mirror(fake, tmp_path):
+    return LocalMirror(str(tmp_path / "mirror.db"), fake)
+
+@pytest.fixture
+def reject_negative(monkeypatch):
+    """The server's check constraint: food_logs.calories >= 0."""
+    execute = _Query.execute
+    def checked(query):
+        items = query.payload if isinstance(query.payload, list) else [query.payload]
+        if query.op == "upsert" and any((r or {}).get("calories", 0) < 0 for r in items):
+            raise APIError({"message": "violates check constraint", "code": "23514"})
+        return execute(query)
+    monkeypatch.setattr(_Query, "execute", checked)
+
+# ______ Push ______
+def test_push_sends_writes_in_order(fake, user, mirror):
+    mirror.upsert("food_logs", [log_row(user, "a")])
+    mirror.upsert("food_logs", [log_row(user, "a", calories=250.0)])
+    mirror.delete("food_logs", ["a"])
+    mirror.upsert("food_logs", [log_row(user, "b")])
+
+    assert mirror.push() == 4
+    assert mirror.pending() == 0
+    assert remote(fake, "a") is None
+    assert remote(fake, "b")["calories"] == 100.0
+
+def test_rejected_write_does_not_block_the_outbox(fake, user, mirror, reject_negative):
+    mirror.upsert("food_logs", [log_row(user, "bad", calories=-5.0)])
+    mirror.upsert("food_logs", [log_row(user, "good")])
+
+    assert mirror.push() == 1
+    assert remote(fake, "good") is not None
+    assert remote(fake, "bad") is None
+    assert mirror.stats() == {"pending": 0, "dead_letters": 1}
+    dead = mirror.dead_letters()[0]
+    assert (dead["tbl"], dead["op"], dead["attempts"]) == ("food_logs", "upsert", 1)
+    assert "check constraint" in dead["last_error"]
+
+    # no longer pending, so the next pull drops the local copy the server never took
+    mirror.pull(user)
+    ids = {r["log_id"] for r in mirror.select("food_logs", user)}
+    assert "good" in ids and "bad" not in ids
+
+def test_unreachable_server_keeps_writes_queued(fake, user, mirror, monkeypatch):
+    def offline(query):
+        raise httpx.ConnectError("connection refused")
+    monkeypatch.setattr(_Query, "execute", offline)
+    mirror.upsert("food_logs", [log_row(user, "a")])
+    for _ in range(mirror_module.MAX_PUSH_ATTEMPTS + 1):
+        assert mirror.push() == 0
+    assert mirror.stats() == {"pending": 1, "dead_letters": 0}
+
+    monkeypatch.undo()
+    assert mirror.push() == 1
+    assert remote(fake, "a") is not None
+
+def test_transient_failures_are_set_aside_after_max_attempts(fake, user, mirror, monkeypatch):
+    def busy(query):
+        raise APIError({"message": "canceling statement due to statement timeout", "code": "57014"})
+    monkeypatch.setattr(_Query, "execute", busy)
+    mirror.upsert("food_logs", [log_row(user, "a")])
+    for _ in range(mirror_module.MAX_PUSH_ATTEMPTS - 1):
+        mirror.push()
+    assert mirror.stats() == {"pending": 1, "dead_letters": 0}
+    mirror.push()
+    assert mirror.stats() == {"pending": 0, "dead_letters": 1}
+
+def test_local_writes_wake_the_worker(mirror):
+    mirror.worker = mirror_module.SyncWorker(mirror)
+    mirror.upsert("macro_goals", [{"user_id": "u", "calories": 1800}])
+    assert mirror.worker.wake.is_set()
+
+# ______ Pull ______
+def test_pull_brings_remote_changes_and_deletes(fake, user, mirror):
+    mirror.track(user)
+    assert len(mirror.select("food_logs", user)) == 200
+
+    latest = max(r["date"] for r in fake.rows("food_logs") if r["user_id"] == user)
+    edited, deleted = [r for r in fake.rows("food_logs") if r["user_id"] == user and r["date"] == latest][:2]
+    edited["calories"] = 999.0
+    fake.tables["food_logs"] = [r for r in fake.rows("food_logs") if r is not deleted]
+    fake.writes += 1
+
+    assert "food_logs" in mirror.pull(user)
+    local = {r["log_id"]: r for r in mirror.select("food_logs", user)}
+    assert len(local) == 199
+    assert local[edited["log_id"]]["calories"] == 999.0
+    assert deleted["log_id"] not in local
+    assert mirror.pull(user) == []
+
+def test_pending_local_write_wins_until_pushed(fake, user, mirror):
+    mirror.track(user)
+    goals = next(r for r in fake.rows("macro_goals") if r["user_id"] == user)
+    mirror.upsert("macro_goals", [{"user_id": user, "calories": 1800}])
+    goals["calories"] = 2500          # a concurrent edit elsewhere
+    fake.writes += 1
+
+    mirror.pull(user)
+    assert mirror.select("macro_goals", user)[0]["calories"] == 1800
+
+    mirror.push()
+    mirror.pull(user)
+    assert goals["calories"] == 1800
+    assert mirror.select("macro_goals", user)[0]["calories"] == 1800
+
+def test_concurrent_track_waits_for_the_first_pull(fake, user, mirror):
+    fake.latency = 0.02
+    first = threading.Thread(target=mirror.track, args=(user,))
+    first.start()
+    time.sleep(0.03)    # the first pull is past macro_goals
+    mirror.track(user)
+    assert len(mirror.select("food_logs", user)) == 200
+    first.join()
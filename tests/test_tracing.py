@@ -0,0 +1,38 @@
+import os
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+import data
+import db
+import tracing
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+@pytest.fixture
+def app(fake, user, monkeypatch):
+    # as in db.py, the app's client records its calls in the rerun trace
+    monkeypatch.setattr(db, "supabase", tracing.traced_client(fake))
+    monkeypatch.setattr(data, "supabase", db.supabase)
+    at = AppTest.from_file(APP, default_timeout=60)
+    at.session_state["user_id"] = user
+    at.session_state["username_cleaned"] = "ana"
+    at.session_state["active_tab_index"] = 1
+    return at
+
+def recorded(user_id) -> set:
+    return {key for summary in tracing.get_trace_store().recent(user_id) for key in summary["by_table"]}
+
+def test_a_write_rerun_is_recorded(app, user):
+    app.run()
+    app.text_input[0].set_value("Toast")
+    next(b for b in app.button if b.label == "Log Food").click()
+    app.run()
+    assert not app.exception
+    assert "food_logs.upsert" in recorded(user)
+
+def test_login_page_runs_are_recorded(fake):
+    at = AppTest.from_file(APP, default_timeout=60)
+    at.run()
+    assert not at.exception
+    assert tracing.get_trace_store().totals(None)["reruns"] == 1
@@ -0,0 +1,210 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+import streamlit as st
+
+log = logging.getLogger("macro_tracker.trace")
+
+# ______ Per-rerun traces ______
+# Every script run gets one RerunTrace.  Supabase calls made while it is the
+# current trace (on the script thread, or on pool threads started with a
+# copy of its context) are recorded in it, as are the timed spans around
+# each render_* section.  finish() turns it into a summary that is logged as
+# one JSON line and kept per user for the ?debug=1 panel.
+_current = contextvars.ContextVar("rerun_trace", default=None)
+
+class RerunTrace:
+    def __init__(self, user_id: str = None):
+        self.user_id = user_id
+        self.started = time.time()
+        self._t0     = time.perf_counter()
+        self._lock   = threading.Lock()
+        self._depth  = 0
+        self.calls   = []   # {table, op, ms, rows, bytes, error}
+        self.spans   = []   # {name, ms, depth}, in the order they finished
+        self.store   = None  # the TraceStore finish() adds the summary to
+
+    def add_call(self, **call):
+        with self._lock:
+            self.calls.append(call)
+
+    def summary(self) -> dict:
+        with self._lock:
+            calls, spans = list(self.calls), list(self.spans)
+        return {
+            "event":    "rerun",
+            "user_id":  self.user_id,
+            "started":  round(self.started, 3),
+            "ms":       round((time.perf_counter() - self._t0) * 1000, 1),
+            "calls":    len(calls),
+            "call_ms":  round(sum(c["ms"] for c in calls), 1),
+            "rows":     sum(c["rows"] for c in calls),
+            "bytes":    sum(c["bytes"] for c in calls),
+            "errors":   sum(1 for c in calls if c["error"]),
+            "spans":    spans,
+            "by_table": _by_table(calls),
+        }
+
+def _by_table(calls: list) -> dict:
+    out = {}
+    for c in calls:
+        t = out.setdefault(f"{c['table']}.{c['op']}", {"calls": 0, "ms": 0.0, "rows": 0, "bytes": 0})
+        t["calls"] += 1
+        t["ms"]    = round(t["ms"] + c["ms"], 1)
+        t["rows"]  += c["rows"]
+        t["bytes"] += c["bytes"]
+    return out
+
+def begin(user_id: str = None) -> RerunTrace:
+    trace = RerunTrace(user_id)
+    # resolved now: once st.stop() or st.rerun() is under way, any Streamlit
+    # call (even a cache_resource spinner) raises again, and finish() runs then
+    trace.store = get_trace_store()
+    _current.set(trace)
+    return trace
+
+def current():
+    return _current.get()
+
+def finish() -> dict:
+    """Close the current trace: log it as JSON, keep it for its user and return the summary."""
+    trace = _current.get()
+    if trace is None:
+        return {}
+    _current.set(None)
+    summary = trace.summary()
+    log.info(json.dumps(summary, default=str))
+    trace.store.add(summary)
+    return summary
+
+@contextmanager
+def span(name: str):
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    trace._depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace._depth -= 1
+        with trace._lock:
+            trace.spans.append({"name": name, "ms": round((time.perf_counter() - start) * 1000, 1),
+                                "depth": trace._depth})
+
+def traced(fn):
+    """Time every call of fn as a span named after it."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with span(fn.__name__):
+            return fn(*args, **kwargs)
+    return wrapper
+
+# ______ Client wrapper ______
+# The supabase query builders are wrapped rather than patched, so the same
+# tracing works for the real client and for stand-ins with its interface.
+_OPS = {"select", "insert", "upsert", "update", "delete"}
+
+def _size(data) -> tuple:
+    """(rows, approximate JSON bytes) of a response payload."""
+    if data is None:
+        return 0, 0
+    rows = len(data) if isinstance(data, list) else 1
+    return rows, len(json.dumps(data, default=str))
+
+class _TracedQuery:
+    def __init__(self, builder, table: str, op: str):
+        self._builder = builder
+        self._table   = table
+        self._op      = op
+
+    def execute(self):
+        trace = _current.get()
+        if trace is None:
+            return self._builder.execute()
+        start, error, res = time.perf_counter(), None, None
+        try:
+            res = self._builder.execute()
+            return res
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            rows, size = _size(getattr(res, "data", None))
+            trace.add_call(table=self._table, op=self._op, ms=round((time.perf_counter() - start) * 1000, 1),
+                           rows=rows, bytes=size, error=error)
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            return attr
+        op = name if name in _OPS else self._op
+
+        @wraps(attr)
+        def call(*args, **kwargs):
+            out = attr(*args, **kwargs)
+            return _TracedQuery(out, self._table, op) if hasattr(out, "execute") else out
+        return call
+
+class TracedClient:
+    """A supabase client whose table(...)/rpc(...) queries record their execute() calls."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def table(self, name: str):
+        return _TracedQuery(self._client.table(name), name, "select")
+
+    def rpc(self, fn: str, *args, **kwargs):
+        return _TracedQuery(self._client.rpc(fn, *args, **kwargs), fn, "rpc")
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+def traced_client(client):
+    return client if isinstance(client, TracedClient) else TracedClient(client)
+
+# ______ Per-user history ______
+class TraceStore:
+    """The last `keep` rerun summaries per user, plus running totals."""
+
+    def __init__(self, keep: int = 50):
+        self.keep    = keep
+        self._recent = {}   # user_id → deque of summaries
+        self._totals = {}   # user_id → {reruns, ms, calls, call_ms, bytes, errors}
+        self._lock   = threading.Lock()
+
+    def add(self, summary: dict):
+        user = summary.get("user_id") or "anonymous"
+        with self._lock:
+            self._recent.setdefault(user, deque(maxlen=self.keep)).append(summary)
+            totals = self._totals.setdefault(user, dict.fromkeys(("reruns", "ms", "calls", "call_ms", "bytes", "errors"), 0))
+            totals["reruns"] += 1
+            for field in ("ms", "calls", "call_ms", "bytes", "errors"):
+                totals[field] = round(totals[field] + summary[field], 1)
+
+    def recent(self, user_id: str) -> list:
+        with self._lock:
+            return list(self._recent.get(user_id or "anonymous", ()))
+
+    def totals(self, user_id: str) -> dict:
+        with self._lock:
+            return dict(self._totals.get(user_id or "anonymous", {}))
+
+@st.cache_resource
+def get_trace_store() -> TraceStore:
+    # MACRO_TRACKER_TRACE_LOG=1 prints each rerun summary as a JSON line
+    if os.getenv("MACRO_TRACKER_TRACE_LOG") and not log.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        log.addHandler(handler)
+        log.setLevel(logging.INFO)
+        log.propagate = False
+    return TraceStore()